@@ -1,48 +1,44 @@
 # from bot import personaldps, personaltime
-from threading import Thread
+import asyncio
+import json
+import os
+import time
+from collections.abc import AsyncIterator
 
-from quart import Quart, request
+from quart import Quart, Response, g, request
 
 from bot import (
+    bot,
     internalmessage,
     logger,
     patchdpsrecord,
     patchtimerecord,
     pingreportedlog,
-    run_discord_bot,
+    profiler,
+    start_discord_bot,
 )
+from ingest import RecordQueue, validate_record
+from metrics import registry
 
 app = Quart(__name__)
 
-t = Thread(target=run_discord_bot)
-t.daemon = True
-t.start()
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5005, debug=True)
-
-
-@app.route("/")
-async def hello() -> str:
-    return "Hello World"
-
-
-@app.route("/patchrecord/", methods=["POST"])
-async def patchrecord() -> str:
-    content_type = request.headers.get("Content-Type")
-    if content_type != "application/json":
-        return "Content-Type not supported!"
-    data: dict[str, str | int | bool | list[str]] = await request.get_json()
+async def process_record(data: dict) -> None:
+    run = profiler.start("patchrecord", data["type"]) if profiler.rate else None
+    try:
+        await ping_record(data)
+    finally:
+        if run is not None:
+            profiler.finish(run)
 
-    logger.debug(data)
 
+async def ping_record(data: dict) -> None:
     if data["type"] == "time":
         try:
             await patchtimerecord(data)
         except Exception:
             logger.error(data)
             logger.exception("Patch time record did not ping")
-            return "Fail"
 
     elif data["type"] == "dps":
         try:
@@ -50,7 +46,6 @@ async def patchrecord() -> str:
         except Exception:
             logger.error(data)
             logger.exception("Patch DPS record did not ping")
-            return "Fail"
 
     elif data["type"] == "supportdps":
         try:
@@ -58,9 +53,148 @@ async def patchrecord() -> str:
         except Exception:
             logger.error(data)
             logger.exception("Patch Support DPS record did not ping")
-            return "Fail"
 
-    return "Success"
+
+record_queue = RecordQueue(
+    process_record,
+    workers=int(os.environ.get("INGEST_WORKERS", "4")),
+    maxsize=int(os.environ.get("INGEST_QUEUE_SIZE", "1000")),
+)
+
+discord_task: asyncio.Task | None = None
+
+request_seconds = registry.histogram(
+    "wingmanbot_http_request_seconds",
+    "Webhook request handling time by route and status",
+    ("route", "status"),
+)
+registry.gauge(
+    "wingmanbot_ingest_queue_depth",
+    "Patch records waiting for an ingest worker",
+    lambda: record_queue.depth,
+)
+registry.callback_counter(
+    "wingmanbot_ingest_rejected_total",
+    "Patch records refused because the ingest queue was full",
+    lambda: record_queue.rejected,
+)
+
+
+def log_discord_exit(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Discord client stopped", exc_info=task.exception())
+
+
+@app.before_serving
+async def startup() -> None:
+    # Run the discord client on the same loop as Hypercorn so webhook handlers can await it
+    global discord_task  # noqa: PLW0603
+    discord_task = asyncio.create_task(start_discord_bot())
+    discord_task.add_done_callback(log_discord_exit)
+    await record_queue.start()
+
+
+@app.after_serving
+async def shutdown() -> None:
+    await record_queue.stop()
+    await bot.close()
+    if discord_task is not None:
+        await asyncio.gather(discord_task, return_exceptions=True)
+
+
+@app.before_request
+async def start_timer() -> None:
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+async def observe_request(response: Response) -> Response:
+    start = getattr(g, "request_start", None)
+    if start is not None and request.url_rule is not None:
+        request_seconds.observe(
+            time.perf_counter() - start,
+            route=request.url_rule.rule,
+            status=str(response.status_code),
+        )
+    return response
+
+
+@app.route("/")
+async def hello() -> str:
+    return "Hello World"
+
+
+@app.route("/metrics")
+async def metrics() -> tuple[str, int, dict[str, str]]:
+    return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@app.route("/patchrecord/", methods=["POST"])
+async def patchrecord() -> tuple[str, int] | tuple[str, int, dict[str, str]]:
+    content_type = request.headers.get("Content-Type")
+    if content_type != "application/json":
+        return "Content-Type not supported!", 415
+    data: dict[str, str | int | bool | list[str]] = await request.get_json(silent=True)
+
+    logger.debug(data)
+
+    error = validate_record(data)
+    if error is not None:
+        return error, 400
+
+    # Records are pinged by the ingest workers, just acknowledge here
+    if not record_queue.submit(data):
+        return "Overloaded, try again later", 503, {"Retry-After": "5"}
+    return "Accepted", 202
+
+
+def enqueue_record(data: object) -> dict[str, str]:
+    error = validate_record(data)
+    if error is not None:
+        return {"status": "invalid", "error": error}
+    if not record_queue.submit(data):  # pyright: ignore[reportArgumentType]
+        return {"status": "overloaded"}
+    return {"status": "accepted"}
+
+
+async def iter_ndjson() -> AsyncIterator[object]:
+    """Yield each line of an NDJSON request body as soon as it has fully arrived."""
+    buffer = b""
+    async for chunk in request.body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_json_line(line)
+    if buffer.strip():
+        yield parse_json_line(buffer)
+
+
+def parse_json_line(line: bytes) -> object:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+@app.route("/patchrecord/batch/", methods=["POST"])
+async def patchrecordbatch() -> tuple[dict, int] | tuple[str, int]:
+    # Takes many /patchrecord/ payloads at once as a JSON array or an NDJSON stream
+    results = []
+    if request.mimetype == "application/x-ndjson":
+        async for data in iter_ndjson():
+            results.append(enqueue_record(data))
+    elif request.mimetype == "application/json":
+        data = await request.get_json(silent=True)
+        if not isinstance(data, list):
+            return "Expected a JSON array of records", 400
+        results = [enqueue_record(item) for item in data]
+    else:
+        return "Content-Type not supported!", 415
+
+    accepted = sum(result["status"] == "accepted" for result in results)
+    logger.debug(f"Batch of {len(results)} records, {accepted} accepted")
+    return {"accepted": accepted, "results": results}, 200
 
 
 @app.route("/reportlog/", methods=["POST"])
@@ -83,3 +217,7 @@ async def internalmessaging() -> str:
     data: dict[str, str] = await request.get_json()
     await internalmessage(data)
     return "Success"
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5005, debug=True)
@@ -0,0 +1,211 @@
+"""
+Time the /check and /flex command paths against the local Wingman stand-in.
+
+Starts benchmarks/fakewingman.py in-process, points the bot at it and calls the real
+slash command callbacks with a fake interaction, so the Wingman client, caches, database
+and embed building are all included. Each account size is run separately to show how the
+commands scale. Nothing talks to Wingman or Discord.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_commands --bosses 20,60,120 --patches 10 --specs 27
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from benchmarks.fakewingman import FakeWingman, serve
+from flex import FlexCache
+
+ROOT = Path(__file__).resolve().parent.parent
+USER_ID = 1
+
+
+class FakeMessage:
+    async def edit(self, **kwargs: object) -> "FakeMessage":  # noqa: ARG002
+        return self
+
+
+class FakeResponse:
+    async def defer(self, **kwargs: object) -> None:
+        pass
+
+    async def send_message(self, *args: object, **kwargs: object) -> None:
+        pass
+
+    async def edit_message(self, **kwargs: object) -> None:
+        pass
+
+
+class FakeFollowup:
+    def __init__(self) -> None:
+        self.sent: list[dict[str, Any]] = []
+
+    async def send(self, content: str | None = None, **kwargs: Any) -> FakeMessage:  # noqa: ANN401
+        self.sent.append({"content": content, **kwargs})
+        return FakeMessage()
+
+
+class FakeInteraction:
+    def __init__(self) -> None:
+        self.user = SimpleNamespace(id=USER_ID)
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.extras: dict[str, Any] = {}
+        self.command = None
+
+
+async def timed(
+    runs: int,
+    setup: Callable[[], Awaitable[None]],
+    call: Callable[[FakeInteraction], Awaitable[None]],
+) -> tuple[float, FakeInteraction]:
+    """Median milliseconds of call over runs, setup is run before each and not timed."""
+    samples = []
+    interaction = FakeInteraction()
+    for _ in range(runs):
+        await setup()
+        interaction = FakeInteraction()
+        start = time.perf_counter()
+        await call(interaction)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), interaction
+
+
+async def bench_size(bot: Any, wingman: FakeWingman, runs: int) -> dict[str, Any]:  # noqa: ANN401
+    async with serve(wingman) as url:
+        # Every size has its own boss list, so the metadata is refreshed from the stand-in
+        bot.wingman.base_url = url
+        await bot.metadata.refresh(bot.wingman)
+        apikey = f"bench-{wingman.bosses}-{wingman.patches}-{wingman.specs}"
+        await bot.users.set_apikey(USER_ID, apikey)
+        await bot.users.track(USER_ID, bot.metadata.boss_content_lists["all"])
+        # Half of the current patch's logs are newer than this
+        halfway = bot.metadata.mostrecentpatchstartdt + timedelta(days=15)
+
+        async def cold() -> None:
+            bot.wingman.player_cache.invalidate(apikey)
+            bot.flex_cache = FlexCache(ttl=bot.flex_cache.ttl)
+
+        async def timestamps() -> None:
+            await cold()
+            await bot.users.set_lastchecked(USER_ID, halfway)
+
+        async def warm() -> None:
+            pass
+
+        check = bot.check.callback
+        flex = bot.flex.callback
+        before = wingman.requests
+        result: dict[str, Any] = {
+            "bosses": wingman.bosses,
+            "patches": wingman.patches,
+            "specs": wingman.specs,
+            "document_kb": len(wingman.player(apikey)) / 1024,
+        }
+        result["check_timestamps_ms"], interaction = await timed(runs, timestamps, check)
+        result["check_messages"] = len(interaction.followup.sent)
+        result["check_fingerprint_ms"], _ = await timed(runs, cold, check)
+        result["flex_cold_ms"], interaction = await timed(
+            runs,
+            cold,
+            lambda i: flex(i, "dps", "latest", "all", "overall"),
+        )
+        result["flex_filter_ms"], _ = await timed(
+            runs,
+            warm,
+            lambda i: flex(i, "time", "latest", "raids", "overall"),
+        )
+        view = interaction.followup.sent[-1].get("view")
+        if view is not None:
+
+            async def turn(i: FakeInteraction) -> None:
+                last = view.page == view.page_count - 1
+                await (view.previous_page if last else view.next_page).callback(i)
+
+            result["flex_page_ms"], _ = await timed(runs, warm, turn)
+        result["wingman_requests"] = wingman.requests - before
+    return result
+
+
+def report(results: list[dict[str, Any]]) -> None:
+    columns = [
+        ("bosses", "bosses", "{:>6}"),
+        ("doc KB", "document_kb", "{:>8.0f}"),
+        ("check ts", "check_timestamps_ms", "{:>9.2f}"),
+        ("PBs", "check_messages", "{:>4}"),
+        ("check fp", "check_fingerprint_ms", "{:>9.2f}"),
+        ("flex cold", "flex_cold_ms", "{:>9.2f}"),
+        ("flex filter", "flex_filter_ms", "{:>11.2f}"),
+        ("flex page", "flex_page_ms", "{:>9.2f}"),
+        ("requests", "wingman_requests", "{:>8}"),
+    ]
+    print("Median milliseconds per command, ts = timestamp fallback, fp = fingerprint diff")
+    print("  ".join(f"{title:>{len(fmt.format(0))}}" for title, _, fmt in columns))
+    for result in results:
+        print("  ".join(fmt.format(result.get(key, float("nan"))) for _, key, fmt in columns))
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    # Imported here, the bot reads its token and the API URL when it is imported
+    import bot  # noqa: PLC0415
+
+    results = []
+    for bosses in args.bosses:
+        wingman = FakeWingman(
+            patches=args.patches,
+            bosses=bosses,
+            specs=args.specs,
+            latency=args.latency,
+            seed=args.seed,
+        )
+        results.append(await bench_size(bot, wingman, args.runs))
+    await bot.wingman.close()
+    bot.db.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--bosses",
+        type=lambda value: [int(n) for n in value.split(",")],
+        default=[20, 60, 120],
+        help="comma separated boss counts, one run each",
+    )
+    parser.add_argument("--patches", type=int, default=10)
+    parser.add_argument("--specs", type=int, default=27)
+    parser.add_argument("--latency", type=float, default=0.0, help="stand-in response latency")
+    parser.add_argument("--runs", type=int, default=5, help="calls per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    sys.path.insert(0, str(ROOT))
+    # Nothing may reach the real site, the stand-in's address is set per size
+    os.environ["WINGMAN_API_BASE_URL"] = "http://127.0.0.1:9"
+    with tempfile.TemporaryDirectory() as workdir:
+        Path(workdir, "data").mkdir()
+        Path(workdir, "data", "discord_token.txt").write_text("offline")
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
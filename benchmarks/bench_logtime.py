@@ -0,0 +1,65 @@
+"""
+Compare the log link timestamp parser against the strptime version it replaced.
+
+Run from the repository root with: python -m benchmarks.bench_logtime
+"""
+
+import random
+import timeit
+from datetime import datetime as dt
+
+from logtime import epochs_from_links, timestamp_from_link
+
+LINKS = 500  # Roughly the number of links /check looks at for a user tracking everything
+REPEAT = 5
+
+
+def strptime_timestamp(link: str) -> dt:
+    # The parser used before logtime.py
+    format_data = "%Y%m%d-%H%M%S %z"
+    if link.count("-") == 1:
+        timestamp = f"{link[:15]} -0500"
+    elif link.count("-") == 2:  # noqa: PLR2004
+        timestamp = f"{link[5:20]} -0500"
+    else:
+        raise ValueError
+    return dt.strptime(timestamp, format_data)
+
+
+def make_links(n: int) -> list[str]:
+    rng = random.Random(0)
+    links = []
+    for i in range(n):
+        stamp = (
+            f"{rng.randint(2018, 2025)}{rng.randint(1, 12):02}{rng.randint(1, 28):02}"
+            f"-{rng.randint(0, 23):02}{rng.randint(0, 59):02}{rng.randint(0, 59):02}"
+        )
+        links.append(f"{stamp}_vg" if i % 2 else f"a1Bc-{stamp}_sabetha")
+    return links
+
+
+def best(stmt: str, namespace: dict) -> float:
+    number = 20
+    return min(timeit.repeat(stmt, globals=namespace, number=number, repeat=REPEAT)) / number
+
+
+def main() -> None:
+    links = make_links(LINKS)
+    old = [int(strptime_timestamp(link).timestamp()) for link in links]
+    assert old == [int(timestamp_from_link(link).timestamp()) for link in links]
+    assert old == epochs_from_links(links)
+
+    namespace = {**globals(), "links": links}
+    results = {
+        "strptime": best("[strptime_timestamp(link) for link in links]", namespace),
+        "timestamp_from_link": best("[timestamp_from_link(link) for link in links]", namespace),
+        "epochs_from_links": best("epochs_from_links(links)", namespace),
+    }
+    baseline = results["strptime"]
+    print(f"{LINKS} links, best of {REPEAT}")
+    for name, seconds in results.items():
+        print(f"{name:>20}: {seconds * 1e3:8.3f} ms  {baseline / seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
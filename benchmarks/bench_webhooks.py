@@ -0,0 +1,260 @@
+"""
+Load test the /patchrecord/ webhook in-process against a fake Discord backend.
+
+Posts synthetic patch records (or records replayed from an NDJSON file) to the Quart app
+with its test client, lets the ingest workers and the fan-out dispatcher ping a stand-in
+Discord that emulates 429s, and reports throughput and the latency from each POST to the
+last channel send it caused. Nothing talks to Wingman or Discord.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_webhooks --records 200 --channels 40 --json main.json
+    git switch my-branch
+    python -m benchmarks.bench_webhooks --records 200 --channels 40 --compare main.json
+
+INGEST_WORKERS, INGEST_QUEUE_SIZE and COALESCE_WINDOW are read from the environment as usual.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from benchmarks.fakediscord import FakeDiscord
+
+ROOT = Path(__file__).resolve().parent.parent
+PATCH_ID = "bench"
+BOSS_TYPES = ("raid", "strike", "fractal")
+PROFESSIONS = ("Guardian", "Firebrand", "Weaver", "Virtuoso", "Scourge", "Mechanist")
+GROUP_ICON = "https://gw2wingman.nevermindcreations.de/static/groupIcons/bench.png"
+DEFAULT_GROUP_ICON = "https://gw2wingman.nevermindcreations.de/static/groupIcons/defGroup.png"
+
+
+def synthetic_metadata(boss_ids: list[str], names: dict[str, str]) -> dict[str, Any]:
+    # startupvars drops the full encounter AI and Freezie by id, so they have to exist
+    bosses = {
+        "232543": {"name": "Full encounter AI", "type": "fractal", "icon": "/static/ai.png"},
+        "21333": {"name": "Freezie", "type": "strike", "icon": "/static/freezie.png"},
+    }
+    for i, boss_id in enumerate(boss_ids):
+        bosses[boss_id] = {
+            "name": names.get(boss_id, f"Boss {boss_id}"),
+            "type": BOSS_TYPES[i % len(BOSS_TYPES)],
+            "icon": f"/static/{boss_id}.png",
+        }
+    return {
+        "bosses": bosses,
+        "patches": {"patches": [{"id": PATCH_ID, "from": "2000-01-01"}]},
+        "classes": {profession: {} for profession in PROFESSIONS},
+    }
+
+
+def synthetic_record(rng: random.Random, boss_ids: list[str]) -> dict[str, Any]:
+    record_type = rng.choices(("time", "dps", "supportdps"), weights=(4, 5, 1))[0]
+    boss_id = rng.choice(boss_ids)
+    if rng.random() < 0.3:  # noqa: PLR2004
+        boss_id = f"-{boss_id}"
+    grouped = rng.random() < 0.6  # noqa: PLR2004
+    record: dict[str, Any] = {
+        "type": record_type,
+        "bossID": boss_id,
+        "bossName": f"Boss {boss_id.lstrip('-')}",
+        "eraID": rng.choice((PATCH_ID, "all")),
+        "group": ["[BNCH] Bench Guild"] if grouped else [],
+        "groupIcons": [rng.choice((GROUP_ICON, DEFAULT_GROUP_ICON))] if grouped else [],
+    }
+    if record_type == "time":
+        squad = rng.randint(1, 10)
+        record |= {
+            "duration": rng.randint(60_000, 600_000),
+            "previousDuration": rng.randint(600_000, 900_000),
+            "players": [f"Account.{n:04}" for n in range(squad)],
+            "players_chars": [f"Character {n}" for n in range(squad)],
+            "players_professions": [rng.choice(PROFESSIONS) for _ in range(squad)],
+        }
+        if squad < 5:  # noqa: PLR2004
+            record |= {"isLowman": True, "previousPlayerAmount": squad + 1}
+    else:
+        dps = rng.randint(20_000, 60_000)
+        record |= {
+            "character": "Character",
+            "account": "Account.0001",
+            "profession": rng.choice(PROFESSIONS),
+            "dps": dps,
+            "previousDps": dps - rng.randint(1, 2_000),
+        }
+    return record
+
+
+def load_records(path: str) -> list[dict[str, Any]]:
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        # Old eras would be ignored and unknown ones trigger a patch list refresh
+        if record.get("eraID") != "all":
+            record["eraID"] = PATCH_ID
+        record.pop("isDebug", None)
+    return records
+
+
+def subscribe(subscriptions: Any, rng: random.Random, channels: int, boss_ids: list[str]) -> None:  # noqa: ANN401
+    signed = boss_ids + [f"-{boss_id}" for boss_id in boss_ids]
+    for channel_id in range(1, channels + 1):
+        wanted = rng.sample(signed, k=max(1, len(signed) // 2))
+        for ping_type in rng.sample(("time", "dps", "supportdps"), k=rng.randint(1, 3)):
+            for boss_id in wanted:
+                subscriptions.add(channel_id, boss_id, ping_type, lowman=False)
+                if ping_type == "time" and rng.random() < 0.2:  # noqa: PLR2004
+                    subscriptions.add(channel_id, boss_id, ping_type, lowman=True)
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if len(samples) < 2:  # noqa: PLR2004
+        value = samples[0] if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+async def run(args: argparse.Namespace, records: list[dict[str, Any]], boss_ids: list[str]) -> dict:
+    # Imported here, the bot reads its token and metadata relative to the working directory
+    import app as webhook_app  # noqa: PLC0415
+    import bot  # noqa: PLC0415
+
+    fake = FakeDiscord(latency=args.latency, seed=args.seed)
+
+    async def ready() -> None:
+        return None
+
+    bot.bot.wait_until_ready = ready  # pyright: ignore[reportAttributeAccessIssue]
+    bot.bot.get_channel = fake.get_channel  # pyright: ignore[reportAttributeAccessIssue]
+    subscribe(bot.subscriptions, random.Random(args.seed), args.channels, boss_ids)
+
+    for i, record in enumerate(records):
+        record["link"] = f"{i:08}-bench"
+    posted: dict[str, float] = {}
+    statuses: dict[int, int] = {}
+    client = webhook_app.app.test_client()
+    pending = asyncio.Queue()
+    for record in records:
+        pending.put_nowait(record)
+
+    async def poster() -> None:
+        while not pending.empty():
+            record = pending.get_nowait()
+            posted[record["link"]] = time.perf_counter()
+            response = await client.post("/patchrecord/", json=record)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if args.rate:
+                await asyncio.sleep(args.concurrency / args.rate)
+
+    await webhook_app.record_queue.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(poster() for _ in range(args.concurrency)))
+    posted_in = time.perf_counter() - start
+    await webhook_app.record_queue.stop(timeout=3600)
+    while bot.dispatcher.pending:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    last_send: dict[str, float] = {}
+    for message in fake.sent:
+        link = message.url.rsplit("/", 1)[-1] if message.url else ""
+        last_send[link] = max(last_send.get(link, 0.0), message.sent_at)
+    latencies = [sent_at - posted[link] for link, sent_at in last_send.items() if link in posted]
+    return {
+        "records": len(records),
+        "channels": args.channels,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "pinged_records": len(last_send),
+        "sends": len(fake.sent),
+        "rate_limited": dict(fake.rate_limited),
+        "post_seconds": posted_in,
+        "total_seconds": elapsed,
+        "records_per_second": len(records) / elapsed,
+        "sends_per_second": len(fake.sent) / elapsed,
+        "latency": percentiles(latencies),
+    }
+
+
+def report(result: dict, baseline: dict | None = None) -> None:
+    rows = [
+        ("records/s", result["records_per_second"], baseline and baseline["records_per_second"]),
+        ("sends/s", result["sends_per_second"], baseline and baseline["sends_per_second"]),
+        *(
+            (f"{name} latency (s)", value, baseline and baseline["latency"][name])
+            for name, value in result["latency"].items()
+        ),
+    ]
+    print(
+        f"{result['records']} records to {result['channels']} channels, "
+        f"{result['pinged_records']} pinged with {result['sends']} sends "
+        f"in {result['total_seconds']:.2f}s (POSTs done after {result['post_seconds']:.2f}s)",
+    )
+    print(f"HTTP statuses: {result['statuses']}, 429s: {result['rate_limited'] or 'none'}")
+    for name, value, old in rows:
+        line = f"{name:>20}: {value:10.3f}"
+        if old:
+            line += f"  baseline {old:10.3f}  {(value - old) / old:+7.1%}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=100, help="synthetic records to post")
+    parser.add_argument("--payloads", help="NDJSON file of recorded /patchrecord/ payloads")
+    parser.add_argument("--channels", type=int, default=20, help="subscribed channels")
+    parser.add_argument("--bosses", type=int, default=12, help="synthetic bosses")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent POSTs")
+    parser.add_argument("--rate", type=float, default=0, help="POSTs per second, 0 for a burst")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Discord round trip")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file from an earlier run to compare with")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.payloads:
+        records = load_records(args.payloads)
+        names = {str(r["bossID"]).lstrip("-"): r.get("bossName", "") for r in records}
+        boss_ids = sorted(names)
+    else:
+        boss_ids = [str(20000 + i) for i in range(args.bosses)]
+        names = {}
+        records = [synthetic_record(rng, boss_ids) for _ in range(args.records)]
+
+    logging.basicConfig(level=logging.WARNING)
+    sys.path.insert(0, str(ROOT))
+    with tempfile.TemporaryDirectory() as workdir:
+        data = Path(workdir, "data")
+        data.mkdir()
+        (data / "discord_token.txt").write_text("offline")
+        snapshot = {"version": 1, "fetched": "bench", "data": synthetic_metadata(boss_ids, names)}
+        (data / "metadata.json").write_text(json.dumps(snapshot))
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args, records, boss_ids))
+        finally:
+            os.chdir(cwd)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
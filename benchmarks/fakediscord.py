@@ -0,0 +1,81 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from dispatch import TokenBucket
+
+
+@dataclass
+class SentMessage:
+    channel_id: int
+    url: str | None
+    sent_at: float  # time.perf_counter() when the send completed
+    edits: int = 0
+
+    async def edit(self, **kwargs: object) -> "SentMessage":  # noqa: ARG002
+        self.edits += 1
+        return self
+
+
+@dataclass
+class FakeChannel:
+    id: int
+    discord: "FakeDiscord"
+
+    async def send(self, embed: object = None, **kwargs: object) -> SentMessage:  # noqa: ARG002
+        return await self.discord.send(self.id, getattr(embed, "url", None))
+
+
+@dataclass
+class FakeDiscord:
+    """
+    Stand-in for the Discord API that records every message sent to it.
+
+    Sends take latency seconds (plus up to jitter) like a round trip would. Discord's
+    message rate limits are emulated with a global bucket and one per channel, a send that
+    hits one gets a 429 and is retried after retry_after like discord.py does.
+    """
+
+    latency: float = 0.05
+    jitter: float = 0.02
+    global_rate: float = 50.0
+    channel_rate: float = 1.0
+    channel_burst: float = 5.0
+    seed: int = 0
+    sent: list[SentMessage] = field(default_factory=list)
+    rate_limited: Counter[str] = field(default_factory=Counter)
+
+    def __post_init__(self) -> None:
+        self._random = random.Random(self.seed)
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._channels: dict[int, TokenBucket] = {}
+
+    def get_channel(self, channel_id: int) -> FakeChannel:
+        return FakeChannel(channel_id, self)
+
+    def _bucket(self, channel_id: int) -> TokenBucket:
+        bucket = self._channels.get(channel_id)
+        if bucket is None:
+            bucket = self._channels[channel_id] = TokenBucket(self.channel_rate, self.channel_burst)
+        return bucket
+
+    async def send(self, channel_id: int, url: str | None) -> SentMessage:
+        while True:
+            await asyncio.sleep(self.latency + self._random.random() * self.jitter)
+            now = time.monotonic()
+            retry_after = self._global.delay(now)
+            scope = "global"
+            if not retry_after:
+                retry_after = self._bucket(channel_id).delay(now)
+                scope = "channel"
+            if not retry_after:
+                break
+            self.rate_limited[scope] += 1
+            await asyncio.sleep(retry_after)
+        self._global.take(now)
+        self._bucket(channel_id).take(now)
+        message = SentMessage(channel_id, url, time.perf_counter())
+        self.sent.append(message)
+        return message
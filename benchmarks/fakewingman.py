@@ -0,0 +1,187 @@
+"""
+Local stand-in for the Wingman API.
+
+Serves synthetic bosses, patches, classes and getPlayerStats documents whose size is set
+by the number of patches, bosses and specs, with an injected response latency. Point the
+bot at it with WINGMAN_API_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m benchmarks.fakewingman --port 8080 --bosses 120 --patches 20 --latency 0.2
+
+The API key "invalid" gets Wingman's error document, every other key gets a player
+document that is generated once per key and stays the same for the life of the server.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, timedelta
+from datetime import datetime as dt
+from typing import Any
+
+from aiohttp import web
+
+BOSS_TYPES = ("raid", "strike", "fractal")
+PATCH_DAYS = 30
+
+
+@dataclass
+class FakeWingman:
+    patches: int = 10
+    bosses: int = 40
+    specs: int = 27
+    latency: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+    requests: int = 0
+    _players: dict[str, bytes] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self) -> None:
+        self._random = random.Random(self.seed)
+        now = dt.now(UTC)
+        # Newest first, like /api/patches. The newest patch started PATCH_DAYS days ago
+        starts = [now - timedelta(days=PATCH_DAYS * (i + 1)) for i in range(self.patches)]
+        self.patch_list = [
+            {"id": f"p{self.patches - i:03}", "from": start.strftime("%Y-%m-%d")}
+            for i, start in enumerate(starts)
+        ]
+        self.boss_ids = [str(30000 + i) for i in range(self.bosses)]
+        self.spec_names = [f"Spec{i:02}" for i in range(self.specs)]
+        # startupvars drops the full encounter AI and Freezie by id and expects Xera after the
+        # first six raids, so they have to exist
+        bosses = {
+            "232543": {"name": "Full encounter AI", "type": "fractal", "icon": "/static/ai.png"},
+            "21333": {"name": "Freezie", "type": "strike", "icon": "/static/freezie.png"},
+        }
+        for i, boss_id in enumerate(self.boss_ids):
+            bosses[boss_id] = {
+                "name": f"Boss {boss_id}",
+                "type": "raid" if i < 6 else BOSS_TYPES[i % len(BOSS_TYPES)],  # noqa: PLR2004
+                "icon": f"/static/{boss_id}.png",
+            }
+        bosses["16246"] = {"name": "Xera", "type": "raid", "icon": "/static/xera.png"}
+        self.documents = {
+            "bosses": json.dumps(bosses).encode(),
+            "patches": json.dumps({"patches": self.patch_list}).encode(),
+            "classes": json.dumps({spec: {} for spec in self.spec_names}).encode(),
+        }
+
+    def player(self, apikey: str) -> bytes:
+        body = self._players.get(apikey)
+        if body is None:
+            body = self._players[apikey] = json.dumps(self.player_stats(apikey)).encode()
+        return body
+
+    def player_stats(self, apikey: str) -> dict[str, Any]:
+        rng = random.Random(f"{self.seed}-{apikey}")
+        account = f"Bench.{rng.randint(0, 9999):04}"
+        now = dt.now(UTC)
+        times: dict[str, dict] = {}
+        performances: dict[str, dict] = {}
+        support: dict[str, dict] = {}
+        # Oldest patch first and the all time entry last, the order Wingman uses
+        alltime = {"id": "all", "from": self.patch_list[-1]["from"]}
+        for patch in [*reversed(self.patch_list), alltime]:
+            start = dt.strptime(patch["from"], "%Y-%m-%d").replace(tzinfo=UTC)
+            end = min(now, start + timedelta(days=PATCH_DAYS))
+
+            def link(boss_id: str, start: dt = start, end: dt = end) -> str:
+                when = start + (end - start) * rng.random()
+                return f"{when.strftime('%Y%m%d-%H%M%S')}_{boss_id}"
+
+            times[patch["id"]] = {}
+            performances[patch["id"]] = {}
+            support[patch["id"]] = {}
+            for boss_id in self.boss_ids:
+                for signed in (boss_id, f"-{boss_id}"):
+                    times[patch["id"]][signed] = {
+                        "link": link(signed),
+                        "durationMS": rng.randint(60_000, 600_000),
+                    }
+                    specs = rng.sample(self.spec_names, k=rng.randint(1, len(self.spec_names)))
+                    tops = {
+                        spec: {"link": link(signed), "topDPS": rng.randint(5_000, 60_000)}
+                        for spec in specs
+                    }
+                    tops["overall"] = max(tops.values(), key=lambda top: top["topDPS"])
+                    performances[patch["id"]][signed] = tops
+                    support[patch["id"]][signed] = {
+                        spec: {"link": link(signed), "topDPS": rng.choice((0, 1_000, 8_000))}
+                        for spec in [*specs, "overall"]
+                    }
+        return {
+            "account": account,
+            "topBossTimes": times,
+            "topPerformances": performances,
+            "topPerformancesSupport": support,
+        }
+
+    async def _respond(self, body: bytes) -> web.Response:
+        self.requests += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._random.random() * self.jitter)
+        return web.Response(body=body, content_type="application/json")
+
+    async def handle_document(self, request: web.Request) -> web.Response:
+        body = self.documents.get(request.match_info["name"])
+        if body is None:
+            raise web.HTTPNotFound
+        return await self._respond(body)
+
+    async def handle_player_stats(self, request: web.Request) -> web.Response:
+        apikey = request.query.get("apikey", "")
+        if apikey == "invalid":
+            return await self._respond(b'{"error": "invalid apikey"}')
+        return await self._respond(self.player(apikey))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/getPlayerStats", self.handle_player_stats)
+        app.router.add_get("/api/{name}", self.handle_document)
+        return app
+
+
+@asynccontextmanager
+async def serve(
+    wingman: FakeWingman,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> AsyncIterator[str]:
+    """Run the stand-in on the current loop and yield its base URL."""
+    runner = web.AppRunner(wingman.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    try:
+        yield f"http://{host}:{runner.addresses[0][1]}"
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--patches", type=int, default=10)
+    parser.add_argument("--bosses", type=int, default=40)
+    parser.add_argument("--specs", type=int, default=27)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this much extra latency")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    wingman = FakeWingman(
+        patches=args.patches,
+        bosses=args.bosses,
+        specs=args.specs,
+        latency=args.latency,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    web.run_app(wingman.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,15 @@
-import importlib
+import asyncio
 import json
 import logging
 import logging.config
+import os
 import pathlib
-import pickle
-import sqlite3
 import ssl
-import urllib
-import urllib.request
+import time
+from collections.abc import Iterable, Sequence
 from datetime import UTC
 from datetime import datetime as dt
+from functools import partial
 from os.path import exists
 from typing import Literal
 from urllib.parse import quote as urlquote
@@ -17,21 +17,22 @@ from urllib.parse import quote as urlquote
 import discord
 from discord import app_commands
 from discord.ext import commands
-from discord.utils import get
-
-import startupvars
-from startupvars import (
-    boss_content_lists,
-    boss_content_sets,
-    bossdump,
-    bossidtoname,
-    example_boss_ids,
-    initializedb,
-    mostrecentpatchid,
-    mostrecentpatchstartdt,
-    patchidlist,
-    professions,
-)
+
+from channelhealth import ChannelHealth
+from coalesce import BurstCoalescer
+from dispatch import FanoutDispatcher
+from emojiindex import EmojiIndex
+from flex import FlexCache, FlexPages
+from logtime import epochs_from_links
+from loopwatch import LoopWatchdog
+from metrics import registry
+from pbdiff import Fingerprint, changed, fingerprint
+from poller import PBPoller
+from profiling import Profiler
+from startupvars import BossInfo, MetadataUnavailableError, example_boss_ids, metadata
+from storage import Database, UserData, UserStore
+from subscriptions import SubscriptionIndex
+from wingmanapi import WingmanAPIError, WingmanClient
 
 logger = logging.getLogger(__name__)
 
@@ -43,11 +44,156 @@ intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="?", description=description, intents=intents)
+wingman = WingmanClient(
+    cache_ttl=float(os.environ.get("PLAYER_CACHE_TTL", "60")),
+    cache_size=int(os.environ.get("PLAYER_CACHE_SIZE", "256")),
+)
+subscriptions = SubscriptionIndex()
+dispatcher = FanoutDispatcher()
+emoji_guild_id = os.environ.get("EMOJI_GUILD_ID")
+emojis = EmojiIndex(int(emoji_guild_id) if emoji_guild_id else None)
+channel_health = ChannelHealth(
+    threshold=int(os.environ.get("DEAD_CHANNEL_THRESHOLD", "5")),
+    grace_period=float(os.environ.get("DEAD_CHANNEL_GRACE_PERIOD", "86400")),
+)
+flex_cache = FlexCache(ttl=float(os.environ.get("FLEX_CACHE_TTL", "60")))
+
+send_seconds = registry.histogram(
+    "wingmanbot_discord_send_seconds",
+    "Latency of record pings sent to Discord, including rate limit waits",
+)
+send_failures = registry.counter(
+    "wingmanbot_discord_send_failures_total",
+    "Record pings Discord refused or that failed",
+    ("reason",),
+)
+registry.gauge(
+    "wingmanbot_fanout_pending",
+    "Record pings queued or in flight in the fan-out dispatcher",
+    lambda: dispatcher.pending,
+)
+command_seconds = registry.histogram(
+    "wingmanbot_command_seconds",
+    "Slash command run time by command and outcome",
+    ("command", "status"),
+)
+
+
+background_tasks: set[asyncio.Task] = set()
+PATCH_REFRESH_INTERVAL = 3600
+CHANNEL_PRUNE_INTERVAL = 3600
+DISCORD_MESSAGE_LIMIT = 2000
+# Off unless PROFILE_RATE is set or an owner turns it on with /profiling
+profiler = Profiler(
+    rate=float(os.environ.get("PROFILE_RATE", "0")),
+    targets=[t.strip() for t in os.environ.get("PROFILE_TARGETS", "").split(",") if t.strip()],
+    max_files=int(os.environ.get("PROFILE_MAX_FILES", "200")),
+)
+# Discord and the webhooks share one loop, so one watchdog covers both
+loop_watchdog = LoopWatchdog(threshold=float(os.environ.get("LOOP_LAG_THRESHOLD", "0.25")))
+
+
+async def refresh_metadata() -> None:
+    try:
+        await metadata.refresh(wingman)
+    except WingmanAPIError:
+        logger.exception("Could not refresh Wingman metadata, keeping the snapshot")
+
+
+class NotOwnerError(app_commands.CheckFailure):
+    """Raised when someone other than the bot owner uses an owner-only command."""
+
+
+async def is_bot_owner(interaction: discord.Interaction) -> bool:
+    client = interaction.client
+    if isinstance(client, commands.Bot) and await client.is_owner(interaction.user):
+        return True
+    raise NotOwnerError("Only the bot owner can use this command.")
+
+
+# commands.is_owner() only applies to prefix commands, app commands need their own check
+owner_only = app_commands.check(is_bot_owner)
+
+
+class TimedCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Picked up by observe_command once the command is done
+        interaction.extras["started"] = time.perf_counter()
+        if profiler.rate and interaction.command is not None:
+            name = interaction.command.qualified_name
+            interaction.extras["profile"] = profiler.start(name, "command")
+        return True
+
+
+def observe_command(interaction: discord.Interaction, status: str) -> None:
+    run = interaction.extras.pop("profile", None)
+    if run is not None:
+        profiler.finish(run)
+    started = interaction.extras.get("started")
+    if started is None:
+        return
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    command_seconds.observe(time.perf_counter() - started, command=name, status=status)
+
+
+class WingmanBot(commands.Bot):
+    async def setup_hook(self) -> None:
+        loop_watchdog.start()
+        # Start from the snapshot on disk and only wait on Wingman if there is none yet
+        if metadata.load_snapshot():
+            task = asyncio.create_task(refresh_metadata())
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+        else:
+            try:
+                await metadata.refresh(wingman)
+            except WingmanAPIError as e:
+                raise MetadataUnavailableError(
+                    "No metadata snapshot and Wingman could not be reached, cannot start",
+                ) from e
+
+        background_tasks.add(
+            asyncio.create_task(metadata.run_patch_refresher(wingman, PATCH_REFRESH_INTERVAL)),
+        )
+        background_tasks.add(asyncio.create_task(run_channel_pruner()))
+        if pb_poller is not None:
+            background_tasks.add(asyncio.create_task(run_pb_poller(pb_poller)))
+        subscriptions.load(
+            await fetch_sql("SELECT id, boss_id, type, lowman FROM bossserverchannels"),
+        )
+        logger.info(f"Loaded {len(subscriptions)} channel subscriptions")
+        coalescer.channel_windows = dict(
+            await fetch_sql(
+                "SELECT id, coalesce_window FROM channelsettings WHERE coalesce_window IS NOT NULL",
+            ),
+        )
+
+        # One-shot import of the old pickle based user data
+        if exists(picklefilename):
+            imported = await asyncio.to_thread(users.import_pickle, picklefilename)
+            os.replace(picklefilename, f"{picklefilename}.imported")
+            logger.info(f"Imported {imported} users from {picklefilename}")
+
+    async def close(self) -> None:
+        for task in background_tasks:
+            task.cancel()
+        await loop_watchdog.stop()
+        await wingman.close()
+        await super().close()
+        db.close()
+
+
+bot = WingmanBot(
+    command_prefix="?",
+    description=description,
+    intents=intents,
+    tree_cls=TimedCommandTree,
+)
 
 dbfilename = "data/wingmanbot.db"
-if not exists(dbfilename):
-    initializedb(dbfilename)
+db = Database(dbfilename)
+users = UserStore(db)
+picklefilename = "data/workingdata.pkl"
 
 
 def setup_logging() -> None:
@@ -58,98 +204,105 @@ def setup_logging() -> None:
     logging.config.dictConfig(config)
 
 
-def savedata() -> None:
-    with open("data/workingdata.pkl", "wb") as f:
-        pickle.dump(workingdata, f)
+async def execute_sql(sql: str, params=()) -> None:  # noqa: ANN001
+    await db.aexecute(sql, params)
 
 
-def get_db_connection() -> tuple[sqlite3.Connection, sqlite3.Cursor]:
-    con = sqlite3.connect(dbfilename)
-    cur = con.cursor()
-    return con, cur
+async def execute_many_sql(sql: str, seq_of_params: Iterable) -> int:
+    return await db.aexecutemany(sql, seq_of_params)
 
 
-def execute_sql(sql: str, params=()) -> None:  # noqa: ANN001
-    con, cur = get_db_connection()
-    cur.execute(sql, params)
-    con.commit()
-    con.close()
+async def fetch_sql(sql: str, params=()) -> list:  # noqa: ANN001
+    return await db.afetch(sql, params)
 
 
-def fetch_sql(sql: str, params=()) -> list:  # noqa: ANN001
-    con, cur = get_db_connection()
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    con.close()
-    return rows
+Subscription = tuple[int, str, str, bool]
 
 
-def isapikeyvalid(key: str) -> bool:
-    with urllib.request.urlopen(
-        f"https://gw2wingman.nevermindcreations.de/api/getPlayerStats?apikey={key}",
-    ) as url:
-        playerstatdump = json.load(url)
-    return "error" not in playerstatdump
+async def subscribe_channels(subs: list[Subscription]) -> int:
+    """Add (channel_id, boss_id, type, lowman) rows in one transaction, skipping existing ones."""
+    added = await execute_many_sql(
+        """INSERT OR IGNORE INTO bossserverchannels VALUES(?,?,?,?)""",
+        subs,
+    )
+    for sub in subs:
+        subscriptions.add(*sub)
+    return added
 
 
-def logtimestampfromlink(link: str) -> dt:
-    format_data = "%Y%m%d-%H%M%S %z"
-    # 1 dash is Wingman uploader link format
-    if link.count("-") == 1:
-        timestamp = f"{link[:15]} -0500"
-    # 2 dashes is dps.report conversion format
-    elif link.count("-") == 2:  # noqa: PLR2004
-        timestamp = f"{link[5:20]} -0500"
-    else:
-        logger.error(f"Could not figure out timestamp from link: {link}")
-        raise ValueError
-    return dt.strptime(timestamp, format_data)
-
-
-# Helper function ensures embed bodies are not more than 1024 characters each.
-def embed_wrap(
-    bosslinks: list[str],
-    stats: list[str],
-) -> tuple[list, list]:  # sourcery skip: simplify-numeric-comparison
-    bosslinkresult = []
-    statresult = []
-    bosslink_string = ""
-    stat_string = ""
-    MAX_LINE_LENGTH = 1024  # noqa: N806
-
-    for i, s in enumerate(bosslinks):
-        # Check if adding the next string would exceed the limit
-        if len(bosslink_string) + len(s) + 1 > MAX_LINE_LENGTH:
-            bosslinkresult.append(bosslink_string)
-            statresult.append(stat_string)
-            bosslink_string = s  # Start a new string
-            stat_string = stats[i]
-        elif bosslink_string:
-            bosslink_string += "\n" + s
-            stat_string += "\n" + stats[i]
-        else:
-            bosslink_string = s
-            stat_string = stats[i]
+async def unsubscribe_channels(subs: list[Subscription]) -> int:
+    """Remove (channel_id, boss_id, type, lowman) rows in one transaction."""
+    removed = await execute_many_sql(
+        """DELETE FROM bossserverchannels WHERE id=? AND boss_id=? AND type=? AND lowman=?""",
+        subs,
+    )
+    for sub in subs:
+        subscriptions.discard(*sub)
+    return removed
+
+
+async def remove_channels(channel_ids: Iterable[int]) -> int:
+    """Delete every subscription and setting of the given channels in one go."""
+    channel_ids = [int(channel_id) for channel_id in channel_ids]
+    if not channel_ids:
+        return 0
+    params = [(channel_id,) for channel_id in channel_ids]
+    await execute_many_sql("""DELETE FROM bossserverchannels WHERE id = ?""", params)
+    await execute_many_sql("""DELETE FROM channelsettings WHERE id = ?""", params)
+    removed = sum(subscriptions.remove_channel(channel_id) for channel_id in channel_ids)
+    for channel_id in channel_ids:
+        coalescer.channel_windows.pop(channel_id, None)
+    channel_health.forget(channel_ids)
+    return removed
 
-    # Add the last string if it's not empty
-    if bosslink_string:
-        bosslinkresult.append(bosslink_string)
-        statresult.append(stat_string)
 
-    return bosslinkresult, statresult
+def list_channels(summary: str, channel_ids: Sequence[int]) -> str:
+    """Summary followed by as many channel ids as fit in one Discord message."""
+    # Room for the ", ... and N more" that replaces the ids that did not fit
+    budget = DISCORD_MESSAGE_LIMIT - len(summary) - 32
+    listed: list[str] = []
+    for channel_id in channel_ids:
+        budget -= len(str(channel_id)) + 2
+        if budget < 0:
+            break
+        listed.append(str(channel_id))
+    report = f"{summary}: {', '.join(listed)}"
+    if len(listed) < len(channel_ids):
+        report += f", ... and {len(channel_ids) - len(listed)} more"
+    return report
+
+
+async def prune_dead_channels() -> list[int]:
+    dead = channel_health.dead_channels()
+    if not dead:
+        return []
+    removed = await remove_channels(dead)
+    summary = f"Pruned {len(dead)} dead channels ({removed} subscriptions)"
+    logger.info(f"{summary}: {', '.join(map(str, dead))}")
+    await internalmessage({"message": list_channels(summary, dead)})
+    return dead
+
+
+async def run_channel_pruner() -> None:
+    await bot.wait_until_ready()
+    while True:
+        await asyncio.sleep(CHANNEL_PRUNE_INTERVAL)
+        try:
+            await prune_dead_channels()
+        except Exception:
+            logger.exception("Pruning dead channels failed")
+
+
+async def isapikeyvalid(key: str) -> bool:
+    playerstatdump = await wingman.get_player_stats(key)
+    return "error" not in playerstatdump
 
 
 @bot.event
 async def on_ready() -> None:
-    global workingdata, aleeva_token  # noqa: PLW0602, PLW0603
-    with open("data/workingdata.pkl", "rb") as f:
-        workingdata = pickle.load(f)
+    emojis.rebuild(bot.guilds)
     await bot.tree.sync()
 
-    dbfilename = "data/wingmanbot.db"
-    if not exists(dbfilename):
-        initializedb(dbfilename)
-
     setup_logging()
 
     if bot.user is not None:
@@ -157,16 +310,58 @@ async def on_ready() -> None:
         logger.debug("------")
 
 
+@bot.event
+async def on_guild_emojis_update(
+    guild: discord.Guild,
+    before: Sequence[discord.Emoji],  # noqa: ARG001
+    after: Sequence[discord.Emoji],
+) -> None:
+    emojis.update_guild(guild.id, after)
+
+
+@bot.event
+async def on_guild_join(guild: discord.Guild) -> None:
+    emojis.update_guild(guild.id, guild.emojis)
+
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild) -> None:
+    emojis.remove_guild(guild.id)
+    # Bot was kicked or the guild was deleted, nothing there can receive pings any more
+    guild_channel_ids = {channel.id for channel in guild.channels}
+    guild_channel_ids |= {thread.id for thread in guild.threads}
+    channel_ids = guild_channel_ids & subscriptions.channel_ids()
+    removed = await remove_channels(channel_ids)
+    if channel_ids:
+        logger.info(
+            f"Left guild {guild.id}, pruned {len(channel_ids)} channels ({removed} subscriptions)",
+        )
+
+
+@bot.event
+async def on_app_command_completion(
+    interaction: discord.Interaction,
+    command: app_commands.Command | app_commands.ContextMenu,  # noqa: ARG001
+) -> None:
+    observe_command(interaction, "ok")
+
+
 @bot.tree.error
 async def on_command_error(
     interaction: discord.Interaction,
     error: discord.app_commands.AppCommandError,
 ) -> None:
+    observe_command(interaction, "error")
     if isinstance(error, app_commands.MissingPermissions):
         await interaction.response.send_message(
             "You must be a server administrator to use this command.",
             ephemeral=True,
         )
+    elif isinstance(error, NotOwnerError):
+        await interaction.response.send_message(
+            "Only the bot owner can use this command.",
+            ephemeral=True,
+        )
     else:
         raise ValueError("Command error that wasn't a permission error.")
         # error = error.original
@@ -175,17 +370,21 @@ async def on_command_error(
 @bot.tree.command(description="Add a user to be tracked")
 @app_commands.describe(api_key="API Key used in Wingman")
 async def adduser(interaction: discord.Interaction, api_key: str) -> None:
-    if not isapikeyvalid(api_key):
-        await interaction.response.send_message(
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        valid = await isapikeyvalid(api_key)
+    except WingmanAPIError:
+        logger.exception("Could not validate API key")
+        await interaction.followup.send("Could not reach Wingman. Try again later.", ephemeral=True)
+        return
+    if not valid:
+        await interaction.followup.send(
             "Invalid API key. Make sure it is the same API key Wingman uses.",
             ephemeral=True,
         )
         return
-    # Remove any old apikeys to ensure theres not multiple for some reason.
-    execute_sql(f"""DELETE FROM users WHERE id = '{interaction.user.id}'""")
-    insertsql = """INSERT INTO users VALUES(?,?,?,?)"""
-    execute_sql(insertsql, (interaction.user.id, api_key, None, None))
-    await interaction.response.send_message("Saving API Key.", ephemeral=True)
+    await users.set_apikey(interaction.user.id, api_key)
+    await interaction.followup.send("Saving API Key.", ephemeral=True)
 
 
 @bot.tree.command(description="Start tracking bosses")
@@ -195,37 +394,90 @@ async def track(
     content_type: Literal["fractals", "raids", "raids cm", "strikes", "strikes cm", "golem"],
 ) -> None:
     user = interaction.user.id
-    if user not in workingdata["user"]:
+    if await users.get(user) is None:
         await interaction.response.send_message(
             "You are not a registered user. Do /adduser",
         )
         return
 
-    workingdata["user"][user]["tracked_boss_ids"] = workingdata["user"][user]["tracked_boss_ids"].union(
-        boss_content_lists[content_type],
-    )
+    await users.track(user, metadata.boss_content_lists[content_type])
 
     await interaction.response.send_message(
         "Added bosses to track list. Next /check will not give PBs to reduce spam.",
         ephemeral=True,
     )
     # Dont spam next time they do /check
-    workingdata["user"][user]["lastchecked"] = None
-    savedata()
+    await users.set_lastchecked(user, None)
+
+
+def find_new_pbs(
+    playerstatdump: dict,
+    tracked_boss_ids: set[str],
+    lastchecked: dt,
+    previous: Fingerprint | None,
+) -> tuple[list[str], Fingerprint]:
+    """
+    Messages for every tracked PB on the current patch that changed since the last check.
+
+    Compares top log links against the fingerprint of the previous check, which also picks up
+    logs uploaded late. Without a fingerprint for this patch it falls back to comparing log
+    timestamps against lastchecked. Returns the messages and the new fingerprint.
+    """
+    current = fingerprint(
+        playerstatdump,
+        metadata.mostrecentpatchid,
+        tracked_boss_ids,
+        metadata.professions,
+    )
+    if previous is not None:
+        keys = changed(current, previous)
+    else:
+        cutoff = lastchecked.timestamp()
+        epochs = epochs_from_links(current.values())
+        keys = [key for key, epoch in zip(current, epochs, strict=True) if epoch > cutoff]
+
+    topstats = playerstatdump["topPerformances"].get(metadata.mostrecentpatchid, {})
+    toptimes = playerstatdump["topBossTimes"].get(metadata.mostrecentpatchid, {})
+    responses = []
+    for key in keys:
+        kind, boss, *spec = key.split(":")
+        if kind == "dps":
+            top = topstats[boss][spec[0]]
+            responses.append(
+                (
+                    f"New best DPS log on {metadata.bosses[boss].name}!\n"
+                    f"Spec: {spec[0]}\nDPS: {top['topDPS']}\n"
+                    f"Link: https://gw2wingman.nevermindcreations.de/log/{top['link']}"
+                ),
+            )
+        else:
+            bosstime = dt.fromtimestamp(toptimes[boss]["durationMS"] / 1000.0).strftime(
+                "%M:%S.%f",
+            )[:-3]
+            responses.append(
+                f"New fastest log on {metadata.bosses[boss].name}!\nTime: {bosstime}\nLink: https://gw2wingman.nevermindcreations.de/log/{toptimes[boss]['link']}",
+            )
+    return responses, current
+
+
+def previous_fingerprint(userdata: UserData) -> Fingerprint | None:
+    # Fingerprints from an older patch cant be compared to the current one
+    if userdata.fingerprint is None or userdata.fingerprint["patch"] != metadata.mostrecentpatchid:
+        return None
+    return userdata.fingerprint["logs"]
 
 
 @bot.tree.command(description="Manually check for new PBs")
 async def check(interaction: discord.Interaction) -> None:
     userid = interaction.user.id
-    if workingdata["user"][userid]["apikey"] is not None and workingdata["user"][userid]["tracked_boss_ids"] != set():
-        APIKey = workingdata["user"][userid]["apikey"]
-        tracked_boss_ids = workingdata["user"][userid]["tracked_boss_ids"]
+    userdata = await users.get(userid)
+    if userdata is not None and userdata.apikey is not None and userdata.tracked_boss_ids != set():
+        APIKey = userdata.apikey
+        tracked_boss_ids = userdata.tracked_boss_ids
+        lastchecked = userdata.lastchecked
 
         # Don't link logs if lastchecked is none or before most recent patch
-        if (
-            workingdata["user"][userid]["lastchecked"] is None
-            or workingdata["user"][userid]["lastchecked"] < mostrecentpatchstartdt
-        ):
+        if lastchecked is None or lastchecked < metadata.mostrecentpatchstartdt:
             await interaction.response.send_message(
                 (
                     "You haven't checked logs yet this patch. "
@@ -234,60 +486,34 @@ async def check(interaction: discord.Interaction) -> None:
                 ),
                 ephemeral=True,
             )
-            workingdata["user"][userid]["lastchecked"] = dt.now(UTC)  # Update last checked
-            savedata()
+            await users.set_lastchecked(userid, dt.now(UTC))  # Update last checked
             return
 
-        with urllib.request.urlopen(
-            f"https://gw2wingman.nevermindcreations.de/api/getPlayerStats?apikey={APIKey}",
-        ) as url:
-            playerstatdump = json.load(url)
-
-        # Look for new top dps log
-        topstats = playerstatdump["topPerformances"][mostrecentpatchid]
-        bossescleared = list(set(tracked_boss_ids).intersection(topstats.keys()))
-        responses = []
-        for boss in bossescleared:
-            # Remove negative from id if present so we can pull boss name from api
-            boss_id = boss[1:] if boss.startswith("-") else boss
-            specscleared = list(set(topstats[boss].keys()).intersection(professions))
-            for spec in specscleared:
-                logtimestamp = logtimestampfromlink(topstats[boss][spec]["link"])
-                # Check if log timestamps are from after last check
-                if logtimestamp > workingdata["user"][userid]["lastchecked"]:
-                    responses.append(
-                        (
-                            f"New best DPS log on {bossdump[boss_id]['name']}!\n"
-                            f"Spec: {spec}\nDPS: {topstats[boss][spec]['topDPS']}\n"
-                            f"Link: https://gw2wingman.nevermindcreations.de/log/{topstats[boss][spec]['link']}"
-                        ),
-                    )
-
-        # Look for new fastest log
-        toptimes = playerstatdump["topBossTimes"][mostrecentpatchid]
-        bossescleared = list(set(tracked_boss_ids).intersection(toptimes.keys()))
-        for boss in bossescleared:
-            # Remove negative from id if present so we can pull boss name from api
-            boss_id = boss[1:] if boss.startswith("-") else boss
-            logtimestamp = logtimestampfromlink(toptimes[boss]["link"])
-            if logtimestamp > workingdata["user"][userid]["lastchecked"]:
-                bosstime = dt.fromtimestamp(toptimes[boss]["durationMS"] / 1000.0).strftime(
-                    "%M:%S.%f",
-                )[:-3]
-                responses.append(
-                    f"New fastest log on {bossdump[boss_id]['name']}!\nTime: {bosstime}\nLink: https://gw2wingman.nevermindcreations.de/log/{toptimes[boss]['link']}",
-                )
+        await interaction.response.defer()
+        try:
+            playerstatdump = await wingman.get_player_stats(APIKey)
+        except WingmanAPIError:
+            logger.exception("Could not fetch player stats for /check")
+            await interaction.followup.send("Could not reach Wingman. Try again later.")
+            return
+
+        checkedat = dt.now(UTC)
+        responses, logs = find_new_pbs(
+            playerstatdump,
+            tracked_boss_ids,
+            lastchecked,
+            previous_fingerprint(userdata),
+        )
 
         if not responses:
-            await interaction.response.send_message("No new PBs")
+            await interaction.followup.send("No new PBs")
         else:
-            await interaction.response.defer()
             for response in responses:
                 await interaction.followup.send(response)
 
-        workingdata["user"][userid]["lastchecked"] = dt.now(UTC)  # Update last checked
-        savedata()
-    elif workingdata["user"][userid]["apikey"] is None:
+        # Update last checked
+        await users.set_checked(userid, checkedat, metadata.mostrecentpatchid, logs)
+    elif userdata is None or userdata.apikey is None:
         await interaction.response.send_message(
             "Error. You need to add your api key first. Do /adduser",
         )
@@ -297,9 +523,91 @@ async def check(interaction: discord.Interaction) -> None:
         )
 
 
+async def autocheck_user(userid: int) -> bool:
+    """Run /check for a user in the background and DM new PBs. Returns if any were sent."""
+    userdata = await users.get(userid)
+    if userdata is None or userdata.apikey is None or not userdata.tracked_boss_ids:
+        return False
+    lastchecked = userdata.lastchecked
+    # Same as /check, the first check of a patch only sets the baseline
+    if lastchecked is None or lastchecked < metadata.mostrecentpatchstartdt:
+        await users.set_lastchecked(userid, dt.now(UTC))
+        return False
+
+    checkedat = dt.now(UTC)
+    playerstatdump = await wingman.poll_player_stats(userdata.apikey)
+    if playerstatdump is None:
+        # Unchanged since the last poll, which already looked at it
+        return False
+    responses, logs = find_new_pbs(
+        playerstatdump,
+        userdata.tracked_boss_ids,
+        lastchecked,
+        previous_fingerprint(userdata),
+    )
+    sent = False
+    if responses:
+        try:
+            user = bot.get_user(userid) or await bot.fetch_user(userid)
+            for response in responses:
+                await user.send(response)
+            sent = True
+        except discord.Forbidden:
+            logger.info(f"Could not DM new PBs to user {userid}, their DMs are closed")
+        except discord.HTTPException:
+            logger.exception(f"Could not DM new PBs to user {userid}")
+    # Recorded even if the DMs failed, otherwise the same PBs are sent again every cycle
+    await users.set_checked(userid, checkedat, metadata.mostrecentpatchid, logs)
+    return sent
+
+
+# Opt in, automatic checks only run when PB_POLL_INTERVAL is set
+pb_poll_interval = float(os.environ.get("PB_POLL_INTERVAL", "0"))
+pb_poller = (
+    PBPoller(
+        autocheck_user,
+        users.autocheck_user_ids,
+        interval=pb_poll_interval,
+        concurrency=int(os.environ.get("PB_POLL_CONCURRENCY", "4")),
+    )
+    if pb_poll_interval > 0
+    else None
+)
+
+
+async def run_pb_poller(poller: PBPoller) -> None:
+    await bot.wait_until_ready()
+    await poller.run()
+
+
+@bot.tree.command(description="Automatically check for new PBs and DM them to you")
+@app_commands.describe(enabled="Whether new PBs should be checked for automatically")
+async def autocheck(interaction: discord.Interaction, enabled: bool) -> None:
+    userid = interaction.user.id
+    if await users.get(userid) is None:
+        await interaction.response.send_message(
+            "You are not a registered user. Do /adduser",
+            ephemeral=True,
+        )
+        return
+    await users.set_autocheck(userid, enabled)
+    if not enabled:
+        await interaction.response.send_message("Stopped checking for new PBs.", ephemeral=True)
+    elif pb_poller is None:
+        await interaction.response.send_message(
+            "Saved, but automatic checks are currently turned off for this bot.",
+            ephemeral=True,
+        )
+    else:
+        await interaction.response.send_message(
+            "Will DM you new PBs on your tracked bosses. Turn it off with /autocheck False",
+            ephemeral=True,
+        )
+
+
 @bot.tree.command(description="Add tracking for when game adds new boss")
 @app_commands.describe(new_boss_id="New boss id, add both positive and negative if CM")
-@commands.is_owner()
+@owner_only
 async def addnewbossid(
     interaction: discord.Interaction,
     boss_type: Literal["fractals", "raids", "strikes", "golem"],
@@ -308,22 +616,21 @@ async def addnewbossid(
     # Example boss of each type we search to find channels with each type
     bossid = example_boss_ids[boss_type]
 
-    rows = fetch_sql(
-        """SELECT DISTINCT id, type, lowman FROM bossserverchannels WHERE boss_id = ?""",
-        (bossid,),
+    rows = subscriptions.subscriptions_for_boss(bossid)
+    await subscribe_channels(
+        [
+            (channel_id, new_boss_id, channel_type, lowman)
+            for channel_id, channel_type, lowman in rows
+        ],
     )
 
-    insertsql = """INSERT INTO bossserverchannels VALUES(?,?,?,?)"""
-    for channel_id, channel_type, lowman in rows:
-        execute_sql(insertsql, (channel_id, new_boss_id, channel_type, lowman))
-
     logger.info(f"Added new boss id: {new_boss_id} to bosstype: {boss_type!s}")
     await interaction.response.send_message(f"Success! Added boss {len(rows)} times")
 
 
 @bot.tree.command(description="Remove tracking for when I fuck up")
 @app_commands.describe(new_boss_id="New boss id, add both positive and negative if CM")
-@commands.is_owner()
+@owner_only
 async def removenewbossid(
     interaction: discord.Interaction,
     boss_type: Literal["fractals", "raids", "strikes", "golem"],
@@ -332,23 +639,22 @@ async def removenewbossid(
     # Example boss of each type we search to find channels with each type
     bossid = example_boss_ids[boss_type]
 
-    rows = fetch_sql(
-        """SELECT DISTINCT id, type, lowman FROM bossserverchannels WHERE boss_id = ?""",
-        (bossid,),
+    rows = subscriptions.subscriptions_for_boss(bossid)
+    await unsubscribe_channels(
+        [
+            (channel_id, new_boss_id, channel_type, lowman)
+            for channel_id, channel_type, lowman in rows
+        ],
     )
 
-    deletesql = "DELETE FROM bossserverchannels WHERE id = ? AND boss_id = ? AND type = ? AND lowman = ?"
-    for channel_id, channel_type, lowman in rows:
-        execute_sql(deletesql, (channel_id, new_boss_id, channel_type, lowman))
-
     logger.info(f"Removed boss id: {new_boss_id} to bosstype: {boss_type}")
     await interaction.response.send_message(f"Success! Removed boss {len(rows)} times")
 
 
 @bot.tree.command(description="What the heck is going on")
-@commands.is_owner()
+@owner_only
 async def debugchannels(interaction: discord.Interaction) -> None:
-    rows = fetch_sql("""SELECT DISTINCT id, type FROM bossserverchannels""")
+    rows = await fetch_sql("""SELECT DISTINCT id, type FROM bossserverchannels""")
     dpschannelids = [item[0] for item in rows if item[1] == "dps"]
     timechannelids = [item[0] for item in rows if item[1] == "time"]
     supportdpschannelids = [item[0] for item in rows if item[1] == "supportdps"]
@@ -367,42 +673,48 @@ async def debugchannels(interaction: discord.Interaction) -> None:
     await interaction.response.send_message("Results sent to log.")
 
 
+@bot.tree.command(description="Profile a fraction of webhook records and slash commands")
+@app_commands.describe(
+    rate="Fraction of calls to profile, 0 turns profiling off",
+    targets="Optional - Comma separated commands, record types or patchrecord to limit it to",
+)
+@owner_only
+async def profiling(interaction: discord.Interaction, rate: float, targets: str = "") -> None:
+    profiler.configure(rate, [target.strip() for target in targets.split(",") if target.strip()])
+    logger.info(f"Profiling rate {profiler.rate}, targets {sorted(profiler.targets) or 'all'}")
+    targetnames = ", ".join(sorted(profiler.targets)) or "everything"
+    await interaction.response.send_message(
+        (
+            f"Profiling {profiler.rate:.1%} of {targetnames}. "
+            f"{profiler.written} profiles written to {profiler.directory}"
+        ),
+        ephemeral=True,
+    )
+
+
+@bot.tree.command(description="Show getPlayerStats and /flex cache counters")
+@owner_only
+async def cachestats(interaction: discord.Interaction) -> None:
+    stats = wingman.player_cache.stats()
+    flexstats = flex_cache.stats()
+    logger.info(f"Player stats cache: {stats}, flex cache: {flexstats}")
+    await interaction.response.send_message(
+        "\n".join(
+            ", ".join(f"{name}: {value}" for name, value in counters.items())
+            for counters in (stats, flexstats)
+        ),
+        ephemeral=True,
+    )
+
+
 @bot.tree.command(description="Remove channel_id from database")
-@commands.is_owner()
+@owner_only
 async def prune_channel(interaction: discord.Interaction, channel_id: str) -> None:
     logger.info(f"Removing channel: {channel_id}")
-    execute_sql("""DELETE FROM bossserverchannels WHERE id = ?""", (channel_id))
+    await remove_channels([int(channel_id)])
     await interaction.response.send_message("Success!")
 
 
-def construct_bossnamelinks_and_stats(
-    boss_id: str,
-    patch_id: str,
-    playerstatdump: dict,
-    leaderboard: Literal["time", "dps", "support"],
-    spec: str,
-) -> tuple[str, str]:
-    bossname = f"{bossidtoname[boss_id[1:]]} CM" if boss_id.startswith("-") else bossidtoname[boss_id]
-
-    if leaderboard == "time":
-        link = (
-            f"https://gw2wingman.nevermindcreations.de/log/{playerstatdump['topBossTimes'][patch_id][boss_id]['link']}"
-        )
-        stat = dt.fromtimestamp(
-            playerstatdump["topBossTimes"][patch_id][boss_id]["durationMS"] / 1000,
-        ).strftime("%M:%S.%f")[:-3]
-        return f"[{bossname}]({link})", stat
-    if leaderboard == "dps":
-        link = f"https://gw2wingman.nevermindcreations.de/log/{playerstatdump['topPerformances'][patch_id][boss_id][spec]['link']}"
-        stat = str(playerstatdump["topPerformances"][patch_id][boss_id][spec]["topDPS"])
-        return f"[{bossname}]({link})", stat
-    if leaderboard == "supportdps":
-        link = f"https://gw2wingman.nevermindcreations.de/log/{playerstatdump['topPerformancesSupport'][patch_id][boss_id][spec]['link']}"
-        stat = str(playerstatdump["topPerformancesSupport"][patch_id][boss_id][spec]["topDPS"])
-        return f"[{bossname}]({link})", stat
-    raise ValueError("Unknown Leaderboard Type")
-
-
 @bot.tree.command(description="Flex on your friends by sharing your best logs.")
 @app_commands.describe(
     leaderboard="Which type of leaderboard you would like to show.",
@@ -427,8 +739,9 @@ async def flex(
     await interaction.response.defer(thinking=True)
     # Check for apikey and retrieve data
     userid = interaction.user.id
-    rows = fetch_sql(f"""SELECT DISTINCT apikey FROM users WHERE id = '{userid}'""")
-    if rows == [] or len(rows) > 1:
+    # Users imported from the old pickle can be registered without an API key
+    userdata = await users.get(userid)
+    if userdata is None or userdata.apikey is None:
         await interaction.followup.send("API-Key Error. Do /adduser with your API-key")
         return
     if spec != "overall" and leaderboard == "time":
@@ -439,69 +752,48 @@ async def flex(
             ),
         )
         return
-    apikey = rows[0][0]
-    logger.debug("Found API key {apikey}")
+    apikey = userdata.apikey
 
-    with urllib.request.urlopen(
-        f"https://gw2wingman.nevermindcreations.de/api/getPlayerStats?apikey={apikey}",
-    ) as url:
-        playerstatdump = json.load(url)
+    # Reruns with other filters get the document from the client's cache and rows from flex_cache
+    try:
+        playerstatdump = await wingman.get_player_stats(apikey)
+    except WingmanAPIError:
+        logger.exception("Could not fetch player stats for /flex")
+        await interaction.followup.send("Could not reach Wingman. Try again later.")
+        return
+    if "error" in playerstatdump:
+        await interaction.followup.send("API-Key Error. Do /adduser with your API-key")
+        return
 
     # Handle the command arguments
     if patch_id == "latest":
         patch_id = list(playerstatdump["topBossTimes"].keys())[-2]
 
-    bossescompleted = set(playerstatdump["topBossTimes"][patch_id].keys())
-    bossestocheck = boss_content_sets[content]  # pyright: ignore[reportArgumentType]
-
-    # Intersection of bosses completed and bosses being checked
-    boss_ids = bossescompleted & bossestocheck
-    if not boss_ids:
-        await interaction.followup.send("Did not find any logs for your settings.")
+    bossestocheck = metadata.boss_content_sets[content]  # pyright: ignore[reportArgumentType]
+    flexrows = [
+        row
+        for row in flex_cache.rows(playerstatdump, patch_id, leaderboard, spec)  # pyright: ignore[reportArgumentType]
+        if row.boss_id in bossestocheck
+    ]
+    if not flexrows:
+        if leaderboard == "support":
+            await interaction.followup.send("Did not find any support logs for your settings.")
+        else:
+            await interaction.followup.send("Did not find any logs for your settings.")
         return
 
-    # Create the embed
     accountname = playerstatdump["account"]
-    embed = discord.Embed(
+    pages = FlexPages(
+        userid,
         title=f"{accountname}'s best {leaderboard} logs",
         description=f"For the {patch_id} patch in {content} on {spec}",
+        leaderboard=leaderboard,
+        rows=flexrows,
     )
-
-    bossnamelinks = []
-    stats = []
-    # Construct embed based on the data and arguments
-    for boss_id in boss_ids:
-        if (
-            leaderboard == "support"
-            and playerstatdump["topPerformancesSupport"][patch_id][boss_id][spec]["topDPS"] == 0
-        ):
-            continue
-        if spec in playerstatdump["topPerformances"][patch_id][boss_id]:
-            bossnamelink, stat = construct_bossnamelinks_and_stats(
-                boss_id,
-                patch_id,  # pyright: ignore[reportArgumentType]
-                playerstatdump,
-                leaderboard,
-                spec,  # pyright: ignore[reportArgumentType]
-            )
-            bossnamelinks.append(bossnamelink)
-            stats.append(stat)
-
-    if leaderboard == "support" and not bossnamelinks:
-        await interaction.followup.send("Did not find any support logs for your settings.")
+    if pages.page_count == 1:
+        await interaction.followup.send(embed=pages.embed())
         return
-
-    titletext = {"dps": "DPS", "support": "Support DPS", "time": "Time"}
-    bossnamebody, statbody = embed_wrap(bossnamelinks, stats)
-    for i, body in enumerate(bossnamebody):
-        embed.add_field(name="Boss", value=body, inline=True)
-        embed.add_field(
-            name=f"{titletext[leaderboard]}",
-            value=statbody[i],
-            inline=True,
-        )
-        embed.add_field(name=" ", value=" ")
-    await interaction.followup.send(embed=embed)
+    pages.message = await interaction.followup.send(embed=pages.embed(), view=pages, wait=True)
 
 
 @bot.tree.command(description="Links the about info")
@@ -540,7 +832,7 @@ async def channeltrackboss(
     ],
     only_lowmans: Literal["True", "False"],
 ) -> None:
-    only_lowmans = bool(only_lowmans)  # pyright: ignore[reportAssignmentType]
+    only_lowmans = only_lowmans == "True"  # pyright: ignore[reportAssignmentType]
     if content_type == "golem" and ping_type != "dps":
         await interaction.response.send_message(
             "Only DPS ping type is supported for golems. Try again.",
@@ -549,9 +841,12 @@ async def channeltrackboss(
 
     await interaction.response.defer(thinking=True)
 
-    sql = """INSERT INTO bossserverchannels VALUES(?,?,?,?)"""
-    for boss_id in boss_content_lists[content_type]:
-        execute_sql(sql, (interaction.channel_id, boss_id, ping_type, only_lowmans))
+    await subscribe_channels(
+        [
+            (interaction.channel_id, boss_id, ping_type, only_lowmans)  # pyright: ignore[reportAssignmentType]
+            for boss_id in metadata.boss_content_lists[content_type]
+        ],
+    )
 
     await interaction.followup.send(
         ("Added bosses to track list. Will post in this channel when the next patch record is posted"),
@@ -580,14 +875,47 @@ async def channeluntrackboss(
     only_lowmans: Literal["true", "false"],
 ) -> None:
     await interaction.response.defer(thinking=True)
+    lowman = only_lowmans == "true"
 
-    sql = """DELETE FROM bossserverchannels WHERE id=? AND boss_id=? AND type=? AND lowman=?"""
-    for boss_id in boss_content_lists[content_type]:
-        execute_sql(sql, (interaction.channel_id, boss_id, ping_type, only_lowmans))
+    await unsubscribe_channels(
+        [
+            (interaction.channel_id, boss_id, ping_type, lowman)  # pyright: ignore[reportAssignmentType]
+            for boss_id in metadata.boss_content_lists[content_type]
+        ],
+    )
 
     await interaction.followup.send("Removed bosses from track list.")
 
 
+@bot.tree.command(
+    description="Merge repeated records for the same boss posted within a window into one message",
+)
+@app_commands.describe(
+    window_seconds="Seconds to merge records for the same boss and leaderboard. 0 turns it off",
+)
+@app_commands.checks.has_permissions(administrator=True)
+@commands.guild_only()
+async def channelcoalesce(
+    interaction: discord.Interaction,
+    window_seconds: app_commands.Range[int, 0, 3600],
+) -> None:
+    await execute_sql(
+        """INSERT INTO channelsettings(id, coalesce_window) VALUES(?, ?)
+        ON CONFLICT(id) DO UPDATE SET coalesce_window = excluded.coalesce_window""",
+        (interaction.channel_id, window_seconds),
+    )
+    coalescer.channel_windows[interaction.channel_id] = window_seconds  # pyright: ignore[reportArgumentType]
+    if window_seconds:
+        await interaction.response.send_message(
+            (
+                f"Records for the same boss within {window_seconds} seconds "
+                "will be merged into one message."
+            ),
+        )
+    else:
+        await interaction.response.send_message("Records will be posted separately.")
+
+
 @bot.event
 async def pingreportedlog(content: dict) -> None:
     await bot.wait_until_ready()
@@ -602,10 +930,9 @@ async def pingreportedlog(content: dict) -> None:
         title=f"Log reported on {bossname}, reason: {reasontext}",
         url=f"https://gw2wingman.nevermindcreations.de/log/{loglink}",
     )
-    if bossid.startswith("-"):
-        bossid = bossid[1:]
-    iconurl = f"https://gw2wingman.nevermindcreations.de{bossdump[bossid]['icon']}"
-    log.set_thumbnail(url=iconurl)
+    info = boss_info(bossid)
+    if info is not None:
+        log.set_thumbnail(url=info.icon_url)
     log.add_field(name="Time", value=time, inline=True)
     log.add_field(name="Link", value=loglink, inline=True)
 
@@ -642,7 +969,7 @@ def determine_era(content: dict, patchidlist: list) -> str | None:
     if content["eraID"] == "all":
         return "All Time"
     if content["eraID"] not in patchidlist:
-        importlib.reload(startupvars)
+        metadata.request_patch_refresh(wingman)
         return "Current Patch"
     if content["eraID"] == patchidlist[0]:
         return "Current Patch"
@@ -650,27 +977,35 @@ def determine_era(content: dict, patchidlist: list) -> str | None:
     return None
 
 
+def boss_info(bossid: str) -> BossInfo | None:
+    """Metadata for a boss, or None (and a metadata refresh) if it is newer than ours."""
+    info = metadata.bosses.get(bossid)
+    if info is None:
+        metadata.request_refresh(wingman)
+    return info
+
+
 def construct_embed(
     title: str,
     url: str,
     groups: str,
-    iconurl: str,
+    iconurl: str | None,
     fields: list[tuple[str, str, bool]],
 ) -> discord.Embed:
     log = discord.Embed(title=title, url=url)
     if groups:
         log.add_field(name="Group", value=groups, inline=False)
-    log.set_thumbnail(url=iconurl)
+    if iconurl is not None:
+        log.set_thumbnail(url=iconurl)
     for name, value, inline in fields:
         log.add_field(name=name, value=value, inline=inline)
     return log
 
 
-def get_icon_url(content: dict, groups: str, bossid: str, bossdump: dict) -> str:
-    # Get the default boss icon
-    if bossid.startswith("-"):
-        bossid = bossid[1:]
-    iconurl = f"https://gw2wingman.nevermindcreations.de{bossdump[bossid]['icon']}"
+def get_icon_url(content: dict, groups: str, bossid: str) -> str | None:
+    # Get the default boss icon, bosses newer than the metadata go without one
+    info = boss_info(bossid)
+    iconurl = info.icon_url if info is not None else None
 
     # If in a group and group has icon use that instead
     if groups:
@@ -685,24 +1020,13 @@ def get_icon_url(content: dict, groups: str, bossid: str, bossdump: dict) -> str
 async def patchtimerecord(content: dict) -> None:
     await bot.wait_until_ready()
     bossid: str = content["bossID"]
-    islowman = False
-    if "isLowman" in content:
-        islowman = bool(content["isLowman"])
-        prev_player_count: int = content["previousPlayerAmount"]
+    # previousPlayerAmount is only sent (and validated) for lowman records
+    islowman = bool(content.get("isLowman"))
 
-    if islowman:
-        rows = fetch_sql(
-            "SELECT DISTINCT id FROM bossserverchannels WHERE boss_id=? AND type=? AND lowman=true",
-            (bossid, "time"),
-        )
-    else:
-        rows = fetch_sql(
-            ("SELECT DISTINCT id FROM bossserverchannels WHERE boss_id=? AND type=? AND lowman=false"),
-            (bossid, "time"),
-        )
+    rows = subscriptions.channels(bossid, "time", islowman)
 
     if "isDebug" in content:
-        rows = [(1070109613355192370,)]
+        rows = {1070109613355192370}
         logger.debug("Debug post")
         logger.debug(content)
 
@@ -711,7 +1035,7 @@ async def patchtimerecord(content: dict) -> None:
         return
 
     bossname = bossname_from_id(content, bossid)
-    era = determine_era(content, patchidlist)
+    era = determine_era(content, metadata.patchidlist)
     if era is None:
         return
 
@@ -724,8 +1048,8 @@ async def patchtimerecord(content: dict) -> None:
     )[:-3]
     loglink = content["link"]
 
-    iconurl = get_icon_url(content, groups, bossid, bossdump)
-    emoji_list = [str(get(bot.emojis, name=spec)) for spec in content["players_professions"]]
+    iconurl = get_icon_url(content, groups, bossid)
+    emoji_list = [str(emojis.get(spec)) for spec in content["players_professions"]]
     playerscontent = "\n".join(f"{m} {n}/{o}" for m, n, o in zip(emoji_list, players, accts, strict=False))
 
     fields = [
@@ -739,7 +1063,7 @@ async def patchtimerecord(content: dict) -> None:
         fields = [
             ("Time", time, True),
             ("Previous Time", prevtime, True),
-            ("Previous Player Count", prev_player_count, True),  # pyright: ignore[reportPossiblyUnboundVariable]
+            ("Previous Player Count", content["previousPlayerAmount"], True),
             ("Era", era, True),
             ("Players", playerscontent, False),
         ]
@@ -752,26 +1076,61 @@ async def patchtimerecord(content: dict) -> None:
         fields,
     )
 
-    send_records(rows, log)
+    summary = f"[{time}](https://gw2wingman.nevermindcreations.de/log/{loglink}) {groups}".rstrip()
+    send_records(rows, log, ("lowmantime" if islowman else "time", bossid), summary)
 
 
 async def send_log(
     channel: discord.abc.GuildChannel | discord.Thread | discord.abc.PrivateChannel,
     log: discord.Embed,
-) -> None:
+) -> discord.Message | None:
     """Handle sending a message and logs any errors."""
+    start = time.perf_counter()
     try:
-        await channel.send(embed=log)  # pyright: ignore[reportAttributeAccessIssue]
+        message = await channel.send(embed=log)  # pyright: ignore[reportAttributeAccessIssue]
+    except (discord.Forbidden, discord.NotFound) as e:
+        send_failures.inc(reason=type(e).__name__)
+        channel_health.record_failure(channel.id)
+        logger.exception(f"Failed to write to channel {channel.id}")
+        return None
     except Exception:
+        send_failures.inc(reason="error")
         logger.exception(f"Failed to write to channel {channel.id}")
+        return None
+    finally:
+        send_seconds.observe(time.perf_counter() - start)
+    channel_health.record_success(channel.id)
+    return message
+
 
+coalescer = BurstCoalescer(
+    dispatcher,
+    send_log,
+    default_window=float(os.environ.get("COALESCE_WINDOW", "0")),
+)
 
-def send_records(rows: list[tuple[int]], log: discord.Embed) -> None:
-    for row in rows:
-        channel = bot.get_channel(row[0])
+
+def send_records(
+    channel_ids: Iterable[int],
+    log: discord.Embed,
+    key: tuple[str, str] | None = None,
+    summary: str = "",
+) -> None:
+    """Dispatch a record embed to channels, coalescing bursts of the same key where enabled."""
+    sends = []
+    for channel_id in channel_ids:
+        channel = bot.get_channel(channel_id)
         if channel is None:
+            channel_health.record_failure(channel_id)
             continue
-        bot.loop.create_task(send_log(channel, log))
+        if key is not None and coalescer.window(channel_id) > 0:
+            send = coalescer.add(channel, channel_id, key, log, summary)  # pyright: ignore[reportArgumentType]
+            if send is None:
+                continue
+        else:
+            send = partial(send_log, channel, log)
+        sends.append((channel_id, send))
+    dispatcher.submit(sends)
 
 
 @bot.event
@@ -781,10 +1140,7 @@ async def patchdpsrecord(
 ) -> None:
     await bot.wait_until_ready()
     bossid: str = content["bossID"]
-    rows = fetch_sql(
-        "SELECT DISTINCT id FROM bossserverchannels WHERE boss_id=? AND type=?",
-        (bossid, leaderboardtype),
-    )
+    rows = subscriptions.channels(bossid, leaderboardtype)
 
     # Dont keep going if no channel wants the ping
     if not rows:
@@ -792,12 +1148,12 @@ async def patchdpsrecord(
         return
 
     if "isDebug" in content:
-        rows = [(1070109613355192370,)]
+        rows = {1070109613355192370}
         logger.debug("Debug post")
         logger.debug(content)
 
     bossname = bossname_from_id(content, bossid)
-    era = determine_era(content, patchidlist)
+    era = determine_era(content, metadata.patchidlist)
     if era is None:
         return
 
@@ -815,9 +1171,9 @@ async def patchdpsrecord(
     groups = ", ".join(content["group"])
     loglink = content["link"]
     titletext = {"dps": "DPS", "supportdps": "Support DPS"}
-    iconurl = get_icon_url(content, groups, bossid, bossdump)
+    iconurl = get_icon_url(content, groups, bossid)
 
-    emoji = get(bot.emojis, name=profession)
+    emoji = emojis.get(profession)
     playercontent = f"{emoji!s} {charname}/{acctname}"
 
     fields = [
@@ -833,26 +1189,32 @@ async def patchdpsrecord(
         fields,
     )
 
-    send_records(rows, log)
+    summary = f"{emoji!s} {charname}/{acctname} {dpsstring} [log](https://gw2wingman.nevermindcreations.de/log/{loglink})"
+    send_records(rows, log, (leaderboardtype, bossid), summary)
 
 
 def bossname_from_id(content: dict, bossid: str) -> str:
-    #  Negative boss IDs are CMs
-    if bossid.startswith("-"):
-        # Check for legendary key first because not all bosses will have it
-        if "isLegendaryCM" in content:
-            if content["isLegendaryCM"]:
-                return content["bossName"] + " LCM"
-        else:
-            return content["bossName"] + " CM"
-    else:
+    #  Negative boss IDs are CMs, not all of them send the legendary key
+    cm = bossid.startswith("-")
+    info = boss_info(bossid)
+    if info is None:
+        # Boss is newer than our metadata, use the name Wingman sent
+        if cm:
+            return content["bossName"] + (" LCM" if content.get("isLegendaryCM") else " CM")
         return content["bossName"]
-    raise ValueError
+    if cm and content.get("isLegendaryCM"):
+        return info.lcm_name
+    return info.display_name
 
 
 with open("data/discord_token.txt") as f:
     token = f.readline()
 
 
+async def start_discord_bot() -> None:
+    """Log in and run the client on the current event loop until it is closed."""
+    await bot.start(token)
+
+
 def run_discord_bot() -> None:
     bot.run(token)
@@ -0,0 +1,40 @@
+import time
+from collections.abc import Iterable
+
+
+class ChannelHealth:
+    """
+    Counts failed deliveries per channel to find channels the bot can no longer post in.
+
+    A channel is considered dead once it has failed at least threshold times in a row and
+    the first of those failures is older than grace_period seconds, so a short Discord
+    outage or a guild being briefly unavailable does not get it pruned.
+    """
+
+    def __init__(self, threshold: int = 5, grace_period: float = 86400.0) -> None:
+        self.threshold = threshold
+        self.grace_period = grace_period
+        self._failures: dict[int, tuple[int, float]] = {}
+
+    def record_failure(self, channel_id: int, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        count, first = self._failures.get(channel_id, (0, now))
+        self._failures[channel_id] = (count + 1, first)
+
+    def record_success(self, channel_id: int) -> None:
+        self._failures.pop(channel_id, None)
+
+    def failures(self, channel_id: int) -> int:
+        return self._failures.get(channel_id, (0, 0.0))[0]
+
+    def dead_channels(self, now: float | None = None) -> list[int]:
+        now = time.time() if now is None else now
+        return [
+            channel_id
+            for channel_id, (count, first) in self._failures.items()
+            if count >= self.threshold and now - first >= self.grace_period
+        ]
+
+    def forget(self, channel_ids: Iterable[int]) -> None:
+        for channel_id in channel_ids:
+            self._failures.pop(channel_id, None)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+from functools import partial
+
+import discord
+
+from dispatch import FanoutDispatcher, SendFactory
+
+logger = logging.getLogger(__name__)
+
+MAX_FIELD_LENGTH = 1024
+
+SendFunc = Callable[[discord.abc.Messageable, discord.Embed], Awaitable[discord.Message | None]]
+
+
+@dataclass
+class Burst:
+    records: list[tuple[discord.Embed, str]] = field(default_factory=list)
+    message: discord.Message | None = None
+    # Resolved with the first message (None if it failed) once its send is done
+    sent: asyncio.Future[discord.Message | None] = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future(),
+    )
+
+
+def merge_embeds(records: list[tuple[discord.Embed, str]]) -> discord.Embed:
+    """Newest record's embed with the earlier records of the burst listed under it."""
+    embed = records[-1][0].copy()
+    earlier = ""
+    for _, summary in reversed(records[:-1]):
+        line = f"{summary}\n"
+        if len(earlier) + len(line) > MAX_FIELD_LENGTH:
+            break
+        earlier += line
+    if earlier:
+        embed.add_field(name="Earlier records", value=earlier, inline=False)
+    return embed
+
+
+class BurstCoalescer:
+    """
+    Merges records for the same (bossID, leaderboard) that arrive close together.
+
+    The first record in a channel is sent straight away and opens a window. Records for the
+    same key that arrive inside the window are not sent, instead the posted message is
+    edited once when the window closes to show the newest record and list the earlier ones.
+    If the first send is still waiting on a rate limit when the window closes, the edit
+    waits for it.
+    """
+
+    def __init__(
+        self,
+        dispatcher: FanoutDispatcher,
+        send: SendFunc,
+        default_window: float = 0.0,
+    ) -> None:
+        self.dispatcher = dispatcher
+        self.send = send
+        self.default_window = default_window
+        self.channel_windows: dict[int, float] = {}
+        self._bursts: dict[tuple[int, Hashable], Burst] = {}
+        self.coalesced = 0
+
+    def window(self, channel_id: int) -> float:
+        return self.channel_windows.get(channel_id, self.default_window)
+
+    def add(
+        self,
+        channel: discord.abc.Messageable,
+        channel_id: int,
+        key: Hashable,
+        embed: discord.Embed,
+        summary: str,
+    ) -> SendFactory | None:
+        """
+        Register a record for a channel.
+
+        Returns the send to dispatch now, or None when the record was folded into an open
+        burst and will show up in the edit at the end of the window.
+        """
+        burst = self._bursts.get((channel_id, key))
+        if burst is not None:
+            burst.records.append((embed, summary))
+            self.coalesced += 1
+            return None
+
+        burst = Burst(records=[(embed, summary)])
+        self._bursts[(channel_id, key)] = burst
+        asyncio.get_running_loop().call_later(
+            self.window(channel_id),
+            self._close,
+            channel,
+            channel_id,
+            key,
+        )
+        return partial(self._send_first, burst, channel, embed)
+
+    async def _send_first(
+        self,
+        burst: Burst,
+        channel: discord.abc.Messageable,
+        embed: discord.Embed,
+    ) -> None:
+        try:
+            burst.message = await self.send(channel, embed)
+        finally:
+            if not burst.sent.done():
+                burst.sent.set_result(burst.message)
+
+    def _close(self, channel: discord.abc.Messageable, channel_id: int, key: Hashable) -> None:
+        burst = self._bursts.pop((channel_id, key), None)
+        if burst is None or len(burst.records) < 2:  # noqa: PLR2004
+            return
+        merged = merge_embeds(burst.records)
+        flush = [(channel_id, partial(self._flush, burst, channel, merged))]
+        # Queue the flush only once the first send is done so it does not hold a send slot
+        burst.sent.add_done_callback(lambda _: self.dispatcher.submit(flush))
+
+    async def _flush(
+        self,
+        burst: Burst,
+        channel: discord.abc.Messageable,
+        merged: discord.Embed,
+    ) -> None:
+        message = await burst.sent
+        if message is None:
+            # First send failed, post the merged record instead
+            await self.send(channel, merged)
+            return
+        try:
+            await message.edit(embed=merged)
+        except discord.HTTPException:
+            logger.exception(f"Failed to edit coalesced message {message.id}")
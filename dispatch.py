@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+
+SendFactory = Callable[[], Awaitable[object]]
+
+
+class TokenBucket:
+    """Simple token bucket, rate tokens per second up to capacity."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class FanoutDispatcher:
+    """
+    Schedules record pings to Discord channels.
+
+    Every submitted record becomes a group of sends. Groups are served round robin so one
+    record going to hundreds of channels cannot hold back the next record. Sends are paced
+    by a global bucket and a bucket per route (channel), and at most max_in_flight are
+    awaited at once. The default rates stay under Discord's limits (50 per second, 5 per 5
+    seconds per channel), because Discord counts a send when it arrives, not when it is
+    dispatched, and uneven round trips can otherwise squeeze a burst into its window.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 10,
+        global_rate: float = 40.0,
+        route_rate: float = 0.9,
+        route_burst: float = 4.0,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._routes: dict[Hashable, TokenBucket] = {}
+        self._groups: deque[deque[tuple[Hashable, SendFactory]]] = deque()
+        self._in_flight: set[asyncio.Task] = set()
+        self._slots: asyncio.Semaphore | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._runner: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        """Sends queued or in flight."""
+        return sum(len(group) for group in self._groups) + len(self._in_flight)
+
+    def submit(self, sends: Iterable[tuple[Hashable, SendFactory]]) -> None:
+        """Queue one record's sends as (route key, coroutine factory) pairs."""
+        group = deque(sends)
+        if not group:
+            return
+        self._ensure_running()
+        self._groups.append(group)
+        self._wakeup.set()  # pyright: ignore[reportOptionalMemberAccess]
+
+    def _ensure_running(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+    def _route_bucket(self, route: Hashable) -> TokenBucket:
+        bucket = self._routes.get(route)
+        if bucket is None:
+            bucket = self._routes[route] = TokenBucket(self.route_rate, self.route_burst)
+        return bucket
+
+    def _next_send(self, now: float) -> tuple[Hashable, SendFactory] | float:
+        """Pop the next send whose route is free, or return how long to wait for one."""
+        wait = float("inf")
+        for _ in range(len(self._groups)):
+            group = self._groups[0]
+            self._groups.rotate(-1)
+            for i, (route, factory) in enumerate(group):
+                delay = self._route_bucket(route).delay(now)
+                if delay == 0:
+                    del group[i]
+                    if not group:
+                        self._groups.remove(group)
+                    return route, factory
+                wait = min(wait, delay)
+        return wait
+
+    async def _run(self) -> None:
+        assert self._slots is not None
+        assert self._wakeup is not None
+        while True:
+            if not self._groups:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            await self._slots.acquire()
+            now = time.monotonic()
+            global_delay = self._global.delay(now)
+            if global_delay:
+                self._slots.release()
+                await asyncio.sleep(global_delay)
+                continue
+
+            nxt = self._next_send(now)
+            if isinstance(nxt, float):
+                self._slots.release()
+                # Every queued route is rate limited, wait for the first to free up or new work
+                self._wakeup.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), nxt)
+                continue
+
+            route, factory = nxt
+            self._global.take(now)
+            self._route_bucket(route).take(now)
+            task = asyncio.create_task(self._send(route, factory))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, route: Hashable, factory: SendFactory) -> None:
+        assert self._slots is not None
+        try:
+            await factory()
+        except Exception:
+            logger.exception(f"Send to {route} failed")
+        finally:
+            self._slots.release()
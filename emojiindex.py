@@ -0,0 +1,49 @@
+from collections.abc import Iterable, Sequence
+
+import discord
+
+
+class EmojiIndex:
+    """
+    Name to emoji lookup over every guild the bot can see.
+
+    When several guilds have an emoji with the same name the home guild wins, then the guild
+    with the lowest id, so the pick does not depend on guild cache order.
+    """
+
+    def __init__(self, home_guild_id: int | None = None) -> None:
+        self.home_guild_id = home_guild_id
+        self._by_guild: dict[int, dict[str, discord.Emoji]] = {}
+        self._by_name: dict[str, discord.Emoji] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def get(self, name: str) -> discord.Emoji | None:
+        return self._by_name.get(name)
+
+    def rebuild(self, guilds: Iterable[discord.Guild]) -> None:
+        self._by_guild = {guild.id: self._names(guild.emojis) for guild in guilds}
+        self._merge()
+
+    def update_guild(self, guild_id: int, emojis: Sequence[discord.Emoji]) -> None:
+        self._by_guild[guild_id] = self._names(emojis)
+        self._merge()
+
+    def remove_guild(self, guild_id: int) -> None:
+        if self._by_guild.pop(guild_id, None) is not None:
+            self._merge()
+
+    @staticmethod
+    def _names(emojis: Sequence[discord.Emoji]) -> dict[str, discord.Emoji]:
+        names: dict[str, discord.Emoji] = {}
+        for emoji in emojis:
+            names.setdefault(emoji.name, emoji)
+        return names
+
+    def _merge(self) -> None:
+        merged: dict[str, discord.Emoji] = {}
+        for guild_id in sorted(self._by_guild, key=lambda gid: (gid != self.home_guild_id, gid)):
+            for name, emoji in self._by_guild[guild_id].items():
+                merged.setdefault(name, emoji)
+        self._by_name = merged
@@ -0,0 +1,237 @@
+import contextlib
+import time
+from collections import OrderedDict
+from datetime import datetime as dt
+from typing import Literal, NamedTuple
+
+import discord
+
+from startupvars import metadata
+
+Leaderboard = Literal["time", "dps", "support"]
+
+LEADERBOARD_TITLES: dict[str, str] = {"dps": "DPS", "support": "Support DPS", "time": "Time"}
+LOG_URL = "https://gw2wingman.nevermindcreations.de/log/"
+
+
+class FlexRow(NamedTuple):
+    boss_id: str  # Kept so rows can be filtered by content without rebuilding them
+    bossname: str
+    link: str
+    stat: str
+
+
+def build_rows(
+    playerstatdump: dict,
+    patch_id: str,
+    leaderboard: Leaderboard,
+    spec: str,
+) -> list[FlexRow]:
+    """Best log per boss on a patch, in the order the bosses are listed on Wingman."""
+    rows = []
+    for boss_id, toptime in playerstatdump["topBossTimes"].get(patch_id, {}).items():
+        boss = metadata.bosses.get(boss_id)
+        if boss is None:
+            continue
+        if leaderboard == "time":
+            stat = dt.fromtimestamp(toptime["durationMS"] / 1000).strftime("%M:%S.%f")[:-3]
+            rows.append(FlexRow(boss_id, boss.display_name, f"{LOG_URL}{toptime['link']}", stat))
+            continue
+        section = "topPerformances" if leaderboard == "dps" else "topPerformancesSupport"
+        top = playerstatdump.get(section, {}).get(patch_id, {}).get(boss_id, {}).get(spec)
+        if top is None or (leaderboard == "support" and top["topDPS"] == 0):
+            continue
+        link = f"{LOG_URL}{top['link']}"
+        rows.append(FlexRow(boss_id, boss.display_name, link, str(top["topDPS"])))
+
+    order = {boss_id: i for i, boss_id in enumerate(metadata.boss_content_lists["all"])}
+    rows.sort(key=lambda row: (order.get(row.boss_id, len(order)), row.bossname))
+    return rows
+
+
+class FlexCache:
+    """
+    The /flex rows built from player documents.
+
+    Rows are keyed by (account, patch_id, leaderboard, spec), so running /flex again with
+    another filter only builds the rows it has not built yet. The documents themselves come
+    from the Wingman client's cache. Rows are dropped after ttl seconds, or as soon as they
+    are asked for with a different document than the one they were built from.
+    """
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 512) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # Rows with when they were built and the id() of their document, a refetched document
+        # is a new object. Only the id is kept so the document itself can be freed
+        self._rows: OrderedDict[tuple[str, str, str, str], tuple[float, int, list[FlexRow]]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _prune(self, now: float) -> None:
+        for key in [key for key, (built, _, _) in self._rows.items() if now - built >= self.ttl]:
+            del self._rows[key]
+            self.expired += 1
+
+    def rows(
+        self,
+        playerstatdump: dict,
+        patch_id: str,
+        leaderboard: Leaderboard,
+        spec: str,
+    ) -> list[FlexRow]:
+        now = time.monotonic()
+        key = (playerstatdump["account"], patch_id, leaderboard, spec)
+        entry = self._rows.get(key)
+        if entry is not None and now - entry[0] < self.ttl and entry[1] == id(playerstatdump):
+            self.hits += 1
+            self._rows.move_to_end(key)
+            return entry[2]
+        self.misses += 1
+        rows = build_rows(playerstatdump, patch_id, leaderboard, spec)
+        self._prune(now)
+        self._rows[key] = (now, id(playerstatdump), rows)
+        self._rows.move_to_end(key)
+        while len(self._rows) > self.maxsize:
+            self._rows.popitem(last=False)
+        return rows
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "row sets": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
+
+
+# Helper function ensures embed bodies are not more than 1024 characters each.
+def embed_wrap(
+    bosslinks: list[str],
+    stats: list[str],
+) -> tuple[list, list]:  # sourcery skip: simplify-numeric-comparison
+    bosslinkresult = []
+    statresult = []
+    bosslink_string = ""
+    stat_string = ""
+    MAX_LINE_LENGTH = 1024  # noqa: N806
+
+    for i, s in enumerate(bosslinks):
+        # Check if adding the next string would exceed the limit
+        if len(bosslink_string) + len(s) + 1 > MAX_LINE_LENGTH:
+            bosslinkresult.append(bosslink_string)
+            statresult.append(stat_string)
+            bosslink_string = s  # Start a new string
+            stat_string = stats[i]
+        elif bosslink_string:
+            bosslink_string += "\n" + s
+            stat_string += "\n" + stats[i]
+        else:
+            bosslink_string = s
+            stat_string = stats[i]
+
+    # Add the last string if it's not empty
+    if bosslink_string:
+        bosslinkresult.append(bosslink_string)
+        statresult.append(stat_string)
+
+    return bosslinkresult, statresult
+
+
+class FlexPages(discord.ui.View):
+    """
+    Previous/next buttons over /flex rows.
+
+    Each page is only rendered when it is first shown. Only the user who ran /flex can turn
+    the pages, the buttons are removed once the view times out.
+    """
+
+    per_page = 15
+
+    def __init__(
+        self,
+        owner_id: int,
+        title: str,
+        description: str,
+        leaderboard: Leaderboard,
+        rows: list[FlexRow],
+    ) -> None:
+        super().__init__(timeout=300.0)
+        self.owner_id = owner_id
+        self.title = title
+        self.description = description
+        self.leaderboard = leaderboard
+        self.rows = rows
+        self.page = 0
+        self.message: discord.Message | None = None
+        self._embeds: dict[int, discord.Embed] = {}
+        self._update_buttons()
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.rows) // self.per_page))
+
+    def embed(self) -> discord.Embed:
+        embed = self._embeds.get(self.page)
+        if embed is None:
+            embed = self._render(self.page)
+            self._embeds[self.page] = embed
+        return embed
+
+    def _render(self, page: int) -> discord.Embed:
+        embed = discord.Embed(title=self.title, description=self.description)
+        rows = self.rows[page * self.per_page : (page + 1) * self.per_page]
+        bossnamebody, statbody = embed_wrap(
+            [f"[{row.bossname}]({row.link})" for row in rows],
+            [row.stat for row in rows],
+        )
+        for i, body in enumerate(bossnamebody):
+            embed.add_field(name="Boss", value=body, inline=True)
+            embed.add_field(
+                name=f"{LEADERBOARD_TITLES[self.leaderboard]}",
+                value=statbody[i],
+                inline=True,
+            )
+            embed.add_field(name=" ", value=" ")
+        if self.page_count > 1:
+            embed.set_footer(text=f"Page {page + 1}/{self.page_count}")
+        return embed
+
+    def _update_buttons(self) -> None:
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id == self.owner_id:
+            return True
+        await interaction.response.send_message("Run /flex to show your own logs.", ephemeral=True)
+        return False
+
+    async def _turn(self, interaction: discord.Interaction, page: int) -> None:
+        self.page = min(max(page, 0), self.page_count - 1)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(
+        self,
+        interaction: discord.Interaction,
+        button: discord.ui.Button,  # noqa: ARG002
+    ) -> None:
+        await self._turn(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(
+        self,
+        interaction: discord.Interaction,
+        button: discord.ui.Button,  # noqa: ARG002
+    ) -> None:
+        await self._turn(interaction, self.page + 1)
+
+    async def on_timeout(self) -> None:
+        if self.message is not None:
+            with contextlib.suppress(discord.HTTPException):
+                await self.message.edit(view=None)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+RECORD_TYPES = ("time", "dps", "supportdps")
+
+# Fields the ping handlers read without a fallback, per record type
+COMMON_FIELDS: dict[str, type | tuple[type, ...]] = {
+    "bossID": str,
+    "eraID": str,
+    "link": str,
+    "group": list,
+}
+DPS_FIELDS: dict[str, type | tuple[type, ...]] = {
+    "character": str,
+    "profession": (str, type(None)),
+    "account": str,
+    "dps": (int, float),
+    "previousDps": (int, float),
+}
+RECORD_FIELDS: dict[str, dict[str, type | tuple[type, ...]]] = {
+    "time": {
+        "duration": (int, float),
+        "previousDuration": (int, float),
+        "players": list,
+        "players_chars": list,
+        "players_professions": list,
+    },
+    "dps": DPS_FIELDS,
+    "supportdps": DPS_FIELDS,
+}
+
+
+def validate_record(data: object) -> str | None:
+    """Return why a /patchrecord/ payload is unusable, or None if it can be queued."""
+    if not isinstance(data, dict):
+        return "Payload must be a JSON object"
+    record_type = data.get("type")
+    if record_type not in RECORD_TYPES:
+        return f"Unknown record type: {record_type}"
+    fields = {**COMMON_FIELDS, **RECORD_FIELDS[record_type]}
+    if record_type == "time" and data.get("isLowman"):
+        fields["previousPlayerAmount"] = int
+    if data.get("group"):
+        fields["groupIcons"] = list
+    missing = [name for name in fields if name not in data]
+    if missing:
+        return f"Missing {', '.join(missing)}"
+    # bool is an int, but never a valid duration or DPS
+    invalid = [
+        name
+        for name, kind in fields.items()
+        if not isinstance(data[name], kind) or isinstance(data[name], bool)
+    ]
+    if invalid:
+        return f"Invalid {', '.join(invalid)}"
+    if data.get("group") and not data["groupIcons"]:
+        return "Invalid groupIcons"
+    return None
+
+
+class RecordQueue:
+    """
+    Bounded queue of patch records drained by a pool of async workers.
+
+    The HTTP handler only has to validate and enqueue a record, so Wingman gets its answer
+    right away. When the queue is full submit() refuses the record instead of letting
+    latency build up.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[dict], Awaitable[None]],
+        workers: int = 4,
+        maxsize: int = 1000,
+    ) -> None:
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: asyncio.Queue[dict] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.rejected = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, record: dict) -> bool:
+        if self._queue is None:
+            raise RuntimeError("RecordQueue has not been started")
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Record queue full ({self.maxsize}), rejecting record")
+            return False
+        return True
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Give queued records a chance to finish, then cancel the workers."""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except TimeoutError:
+                logger.warning(f"Dropping {self.depth} queued records on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, n: int) -> None:
+        assert self._queue is not None
+        while True:
+            record = await self._queue.get()
+            try:
+                await self.handler(record)
+            except Exception:
+                logger.exception(f"Ingest worker {n} failed to process record: {record}")
+            finally:
+                self._queue.task_done()
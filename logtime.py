@@ -0,0 +1,56 @@
+from collections.abc import Iterable
+from datetime import date, timedelta, timezone
+from datetime import datetime as dt
+
+# Log links carry the local time of the uploader as YYYYMMDD-HHMMSS, Wingman treats it as -0500
+LINK_TZ = timezone(timedelta(hours=-5))
+_LINK_OFFSET = 5 * 3600
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _timestamp_start(link: str) -> int:
+    # Wingman uploader links start with the timestamp, dps.report links have a 4 character id
+    # and a dash in front of it
+    if link[8:9] == "-":
+        return 0
+    if link[4:5] == "-" and link[13:14] == "-":
+        return 5
+    raise ValueError(f"Could not figure out timestamp from link: {link}")
+
+
+def _fields(link: str) -> tuple[int, int, int, int, int, int]:
+    i = _timestamp_start(link)
+    digits = link[i : i + 8] + link[i + 9 : i + 15]
+    if len(digits) != 14 or not digits.isdigit():  # noqa: PLR2004
+        raise ValueError(f"Could not figure out timestamp from link: {link}")
+    # One int() and some divmods is cheaper than converting each field on its own
+    ymd, time = divmod(int(digits), 1000000)
+    year, monthday = divmod(ymd, 10000)
+    month, day = divmod(monthday, 100)
+    hour, minutesecond = divmod(time, 10000)
+    minute, second = divmod(minutesecond, 100)
+    # Days past the end of shorter months are caught when the date is built
+    if not (1 <= month <= 12 and 1 <= day <= 31 and hour < 24 and minute < 60 and second < 60):  # noqa: PLR2004
+        raise ValueError(f"Could not figure out timestamp from link: {link}")
+    return year, month, day, hour, minute, second
+
+
+def timestamp_from_link(link: str) -> dt:
+    """Upload time of a Wingman or dps.report log link, raises ValueError if there is none."""
+    year, month, day, hour, minute, second = _fields(link)
+    return dt(year, month, day, hour, minute, second, tzinfo=LINK_TZ)
+
+
+def epochs_from_links(links: Iterable[str]) -> list[int]:
+    """Upload times of log links as unix timestamps, in the same order as the links."""
+    epochs = []
+    for link in links:
+        year, month, day, hour, minute, second = _fields(link)
+        epochs.append(
+            (date(year, month, day).toordinal() - _EPOCH_ORDINAL) * 86400
+            + hour * 3600
+            + minute * 60
+            + second
+            + _LINK_OFFSET,
+        )
+    return epochs
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+lag_seconds = registry.histogram(
+    "wingmanbot_loop_lag_seconds",
+    "How late the event loop woke up a task that asked to sleep",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+stalls = registry.counter(
+    "wingmanbot_loop_stalls_total",
+    "Times the event loop lagged more than the watchdog threshold",
+)
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag and logs what the loop was doing when it stalls.
+
+    A task on the loop wakes up every interval seconds and records how late it was. A
+    separate thread watches that heartbeat, once it is more than threshold seconds overdue
+    it grabs the stack of the loop thread, which is the code blocking it. Stacks are logged
+    at most once per log_interval seconds, stalls in between are only counted.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.25,
+        interval: float = 0.1,
+        log_interval: float = 60.0,
+    ) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.log_interval = log_interval
+        self._heartbeat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._last_logged = float("-inf")
+        self._suppressed = 0
+
+    def start(self) -> None:
+        """Start watching the running loop, must be called from it."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _beat(self) -> None:
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - before - self.interval)
+            lag_seconds.observe(lag)
+            if lag > self.threshold:
+                stalls.inc()
+
+    def _watch(self) -> None:
+        captured = False
+        while not self._stopped.wait(self.interval):
+            overdue = time.monotonic() - self._heartbeat - self.interval
+            if overdue <= self.threshold:
+                captured = False
+                continue
+            if captured:
+                continue
+            # One stack per stall, taken while the loop is still blocked
+            captured = True
+            self._report(overdue)
+
+    def _report(self, overdue: float) -> None:
+        now = time.monotonic()
+        if now - self._last_logged < self.log_interval:
+            self._suppressed += 1
+            return
+        frame = sys._current_frames().get(self._loop_thread)  # pyright: ignore[reportArgumentType]
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable\n"
+        suppressed = ""
+        if self._suppressed:
+            suppressed = f", {self._suppressed} more stalls since the last report"
+        logger.warning(f"Event loop blocked for over {overdue:.3f}s{suppressed}, stack:\n{stack}")
+        self._last_logged = now
+        self._suppressed = 0
@@ -0,0 +1,38 @@
+from collections.abc import Iterable
+
+# Fingerprints map "dps:<boss>:<spec>" and "time:<boss>" to the link of the top log, so two
+# checks can be compared without parsing anything inside the logs.
+Fingerprint = dict[str, str]
+
+
+def dps_key(boss: str, spec: str) -> str:
+    return f"dps:{boss}:{spec}"
+
+
+def time_key(boss: str) -> str:
+    return f"time:{boss}"
+
+
+def fingerprint(
+    playerstatdump: dict,
+    patch_id: str,
+    tracked_boss_ids: Iterable[str],
+    professions: Iterable[str],
+) -> Fingerprint:
+    """Top log links of the tracked bosses on one patch."""
+    tracked = set(tracked_boss_ids)
+    professions = set(professions)
+    result: Fingerprint = {}
+    topstats = playerstatdump["topPerformances"].get(patch_id, {})
+    for boss in tracked.intersection(topstats):
+        for spec in professions.intersection(topstats[boss]):
+            result[dps_key(boss, spec)] = topstats[boss][spec]["link"]
+    toptimes = playerstatdump["topBossTimes"].get(patch_id, {})
+    for boss in tracked.intersection(toptimes):
+        result[time_key(boss)] = toptimes[boss]["link"]
+    return result
+
+
+def changed(current: Fingerprint, previous: Fingerprint) -> list[str]:
+    """Keys whose top log is new or different since the previous fingerprint."""
+    return [key for key, link in current.items() if previous.get(key) != link]
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PBPoller:
+    """
+    Checks every opted in user for new PBs once per interval.
+
+    Checks are spread evenly across the interval instead of all starting at once, at most
+    concurrency of them talk to Wingman at the same time, and users whose checks keep
+    finding nothing are checked less often (every 2, 4, ... up to max_backoff intervals)
+    until they get a new PB again.
+    """
+
+    def __init__(
+        self,
+        check_user: Callable[[int], Awaitable[bool]],
+        list_users: Callable[[], Awaitable[list[int]]],
+        interval: float,
+        concurrency: int = 4,
+        max_backoff: int = 8,
+    ) -> None:
+        self.check_user = check_user
+        self.list_users = list_users
+        self.interval = interval
+        self.concurrency = concurrency
+        self.max_backoff = max_backoff
+        self._cycle = 0
+        self._next_cycle: dict[int, int] = {}
+        self._misses: dict[int, int] = {}
+
+    async def run(self) -> None:
+        while True:
+            start = time.monotonic()
+            try:
+                await self.run_cycle()
+            except Exception:
+                logger.exception("PB polling cycle failed")
+            await asyncio.sleep(max(0.0, start + self.interval - time.monotonic()))
+
+    async def run_cycle(self) -> None:
+        self._cycle += 1
+        user_ids = await self.list_users()
+        # Forget users that opted out
+        opted_in = set(user_ids)
+        self._next_cycle = {uid: c for uid, c in self._next_cycle.items() if uid in opted_in}
+        self._misses = {uid: m for uid, m in self._misses.items() if uid in opted_in}
+
+        due = [uid for uid in user_ids if self._next_cycle.get(uid, 0) <= self._cycle]
+        if not due:
+            return
+        logger.debug(f"PB poll cycle {self._cycle}: {len(due)} of {len(user_ids)} users due")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        spacing = self.interval / len(due)
+        start = time.monotonic()
+        tasks = []
+        for i, userid in enumerate(due):
+            await asyncio.sleep(max(0.0, start + i * spacing - time.monotonic()))
+            await slots.acquire()
+            tasks.append(asyncio.create_task(self._poll(userid, slots)))
+        await asyncio.gather(*tasks)
+
+    async def _poll(self, userid: int, slots: asyncio.Semaphore) -> None:
+        try:
+            found = await self.check_user(userid)
+        except Exception:
+            logger.exception(f"Automatic PB check failed for user {userid}")
+            found = False
+        finally:
+            slots.release()
+
+        if found:
+            self._misses[userid] = 0
+            self._next_cycle[userid] = self._cycle + 1
+        else:
+            misses = self._misses.get(userid, 0) + 1
+            self._misses[userid] = misses
+            self._next_cycle[userid] = self._cycle + min(self.max_backoff, 2 ** (misses - 1))
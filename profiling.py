@@ -0,0 +1,106 @@
+import asyncio
+import cProfile
+import glob
+import logging
+import os
+import random
+import re
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import UTC
+from datetime import datetime as dt
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProfileRun:
+    profile: cProfile.Profile
+    tag: str
+    kind: str
+    started: float
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) or "_"
+
+
+class Profiler:
+    """
+    Profiles a random fraction of webhook records and slash commands with cProfile.
+
+    Only one run can be active at a time, cProfile hooks the whole thread, so a run also
+    picks up whatever else the loop does while the profiled code awaits. Profiles are
+    written to directory as <time>-<tag>-<kind>.prof and can be opened with pstats or
+    snakeviz, only the newest max_files are kept. Callers check rate before calling start(),
+    so nothing is paid while it is 0.
+    """
+
+    def __init__(
+        self,
+        directory: str = "data/profiles",
+        rate: float = 0.0,
+        targets: Iterable[str] = (),
+        max_files: int = 200,
+    ) -> None:
+        self.directory = directory
+        self.max_files = max_files
+        self.rate = rate
+        self.targets = set(targets)
+        self._active: ProfileRun | None = None
+        self._writes: set[asyncio.Task] = set()
+        self.written = 0
+
+    def configure(self, rate: float, targets: Iterable[str] = ()) -> None:
+        self.rate = min(max(rate, 0.0), 1.0)
+        self.targets = set(targets)
+
+    def start(self, tag: str, kind: str) -> ProfileRun | None:
+        """Start profiling if this call is sampled, finish() the returned run when done."""
+        if self._active is not None or random.random() >= self.rate:
+            return None
+        if self.targets and tag not in self.targets and kind not in self.targets:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger or coverage) already owns the hook
+            return None
+        self._active = ProfileRun(profile, tag, kind, time.perf_counter())
+        return self._active
+
+    def finish(self, run: ProfileRun) -> None:
+        run.profile.disable()
+        if self._active is run:
+            self._active = None
+        elapsed = time.perf_counter() - run.started
+        stamp = dt.now(UTC).strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.directory, f"{stamp}-{_safe(run.tag)}-{_safe(run.kind)}.prof")
+        task = asyncio.create_task(asyncio.to_thread(self._write, run.profile, path))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        logger.debug(f"Profiled {run.tag} {run.kind} in {elapsed:.3f}s, writing {path}")
+
+    def _write(self, profile: cProfile.Profile, path: str) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(path)
+            self.written += 1
+        except OSError:
+            logger.exception(f"Could not write profile {path}")
+            return
+        self._rotate()
+
+    def _rotate(self) -> None:
+        # The timestamp prefix makes name order oldest first
+        paths = sorted(glob.glob(os.path.join(glob.escape(self.directory), "*.prof")))
+        for path in paths[: max(len(paths) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Removed by a write that finished at the same time
+                pass
+            except OSError:
+                logger.exception(f"Could not remove old profile {path}")
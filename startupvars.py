@@ -1,81 +1,40 @@
+import asyncio
 import json
-import sqlite3
+import logging
+import os
 import ssl
-import urllib.request
+import time
+from datetime import UTC
 from datetime import datetime as dt
+from functools import cached_property
+from typing import Any, NamedTuple
+
+from wingmanapi import WINGMAN_BASE_URL, WingmanClient
 
 ssl._create_default_https_context = ssl._create_unverified_context
 
+logger = logging.getLogger(__name__)
 
-def initializedb(dbfilename: str) -> None:
-    con = sqlite3.connect(dbfilename)
-    cur = con.cursor()
-    cur.execute(
-        """CREATE TABLE bossserverchannels(id integer, boss_id text, type text)""",
-    )  # Server channels to ping
-    cur.execute(
-        """CREATE TABLE users(id integer, apikey text, boss_id integer, lastchecked text)""",
-    )  # User data
-    con.commit()
-    con.close()
-
-
-# Get all the boss ids
-with urllib.request.urlopen(
-    "http://gw2wingman.nevermindcreations.de/api/bosses",
-) as url:
-    bossdump: dict[str, dict] = json.load(url)
-fractal_cm_boss_ids: list[str] = []
-strike_boss_ids: list[str] = []
-strike_cm_boss_ids: list[str] = []
-raid_boss_ids: list[str] = []
-raid_cm_boss_ids: list[str] = []
-golem_ids: list[str] = []
-bossidtoname: dict[str, str] = {}
-for key in bossdump:
-    if bossdump[key]["type"] == "fractal":
-        fractal_cm_boss_ids.append(f"-{key}")
-    elif bossdump[key]["type"] == "strike":
-        strike_boss_ids.append(key)
-    elif bossdump[key]["type"] == "raid":
-        raid_boss_ids.append(key)
-    elif bossdump[key]["type"] == "golem":
-        golem_ids.append(key)
-    bossidtoname[key] = bossdump[key]["name"]
-
-
-fractal_cm_boss_ids.remove("-232543")  # Remove full encounter ai
-raid_cm_boss_ids = [f"-{boss_id}" for boss_id in raid_boss_ids]
-# Remove wing 1 and 2 and xera as they dont have CMs
-raid_cm_boss_ids[6:].remove("-16246")
-strike_boss_ids.remove("21333")  # Remove freezie
-strike_cm_boss_ids = [f"-{boss_id}" for boss_id in strike_boss_ids][5:]
-
-all_boss_ids: list[str] = (
-    fractal_cm_boss_ids + strike_boss_ids + strike_cm_boss_ids + raid_boss_ids + raid_cm_boss_ids
-)
-
-boss_content_lists: dict[str, list[str]] = {
-    "raids": raid_boss_ids,
-    "raids cm": raid_cm_boss_ids,
-    "strikes": strike_boss_ids,
-    "strikes cm": strike_cm_boss_ids,
-    "fractals": fractal_cm_boss_ids,
-    "golem": golem_ids,
-    "all": all_boss_ids,
-}
+SNAPSHOT_VERSION = 1
+snapshotfilename = "data/metadata.json"
+METADATA_ENDPOINTS = ("bosses", "patches", "classes")
+
+# The only fields of /api/bosses the bot uses, everything else is dropped on load
+BOSS_FIELDS = ("name", "type", "icon")
+
+
+class MetadataUnavailableError(Exception):
+    """Raised when metadata is needed before a snapshot was loaded or a refresh succeeded."""
+
+
+class BossInfo(NamedTuple):
+    name: str  # Plain boss name
+    display_name: str  # With CM appended for negative ids
+    lcm_name: str
+    icon_url: str
+    category: str
 
-raid_id_set: set[str] = set(raid_boss_ids + raid_cm_boss_ids)
-fractal_id_set: set[str] = set(fractal_cm_boss_ids)
-strike_id_set: set[str] = set(strike_boss_ids + strike_cm_boss_ids)
-all_id_set: set[str] = set(all_boss_ids)
 
-boss_content_sets: dict[str, set[str]] = {
-    "raids": raid_id_set,
-    "strikes": strike_id_set,
-    "fractals": fractal_id_set,
-    "all": all_id_set,
-}
 example_boss_ids: dict[str, str] = {
     "raids": "19450",
     "strikes": "22343",
@@ -84,37 +43,250 @@ example_boss_ids: dict[str, str] = {
 }
 
 
-def patchIDdump() -> tuple[list[str], str, str, dt]:
-    # Grab most recent patch ID
-    with urllib.request.urlopen(
-        "https://gw2wingman.nevermindcreations.de/api/patches",
-    ) as url:
-        patchdump = json.load(url)
-    mostrecentpatchid: str = patchdump["patches"][0]["id"]
-    mostrecentpatchstart: str = patchdump["patches"][0]["from"]
-    mostrecentpatchstartdt = dt.strptime(
-        f"{mostrecentpatchstart} 12:30 -0000",
-        "%Y-%m-%d %H:%M %z",
-    )
-    patchidlist: list[str] = [patch["id"] for patch in patchdump["patches"]]
-    return (
-        patchidlist,
-        mostrecentpatchid,
-        mostrecentpatchstart,
-        mostrecentpatchstartdt,
-    )
-
-
-(
-    patchidlist,
-    mostrecentpatchid,
-    mostrecentpatchstart,
-    mostrecentpatchstartdt,
-) = patchIDdump()
-
-# Grab class specs
-with urllib.request.urlopen(
-    "https://gw2wingman.nevermindcreations.de/api/classes",
-) as url:
-    classdump = json.load(url)
-professions = list(classdump.keys())
+class WingmanMetadata:
+    """
+    Boss, patch and class data from the Wingman API.
+
+    Boots from a snapshot on disk so importing the bot never waits on the network, and the
+    derived lookups are only built the first time something asks for them. refresh() pulls
+    fresh data in the background and rewrites the snapshot.
+
+    The patch list changes most often, request_patch_refresh() refreshes just that and
+    collapses concurrent requests into one. request_refresh() does the same for everything,
+    for records about a boss that is newer than the metadata.
+    """
+
+    def __init__(
+        self,
+        path: str = snapshotfilename,
+        min_patch_refresh_interval: float = 60.0,
+        min_refresh_interval: float = 300.0,
+    ) -> None:
+        self.path = path
+        self.min_patch_refresh_interval = min_patch_refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.fetched: str | None = None
+        self._dumps: dict[str, Any] | None = None
+        self._patch_refresh: asyncio.Task | None = None
+        self._patches_refreshed = float("-inf")
+        self._refresh: asyncio.Task | None = None
+        self._refreshed = float("-inf")
+
+    @property
+    def loaded(self) -> bool:
+        return self._dumps is not None
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.info(f"Ignoring metadata snapshot with version {snapshot.get('version')}")
+            return False
+        self._set(snapshot["data"], snapshot["fetched"])
+        return True
+
+    def save_snapshot(self) -> None:
+        snapshot = {"version": SNAPSHOT_VERSION, "fetched": self.fetched, "data": self._dumps}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.path)
+
+    def _set(self, dumps: dict[str, Any], fetched: str) -> None:
+        if "bosses" in dumps:
+            dumps = {
+                **dumps,
+                "bosses": {
+                    key: {field: boss.get(field) for field in BOSS_FIELDS}
+                    for key, boss in dumps["bosses"].items()
+                },
+            }
+        self._dumps = dumps
+        self.fetched = fetched
+        # Drop everything derived from the old data so it is rebuilt on next use
+        derived = [
+            name for name, value in vars(type(self)).items() if isinstance(value, cached_property)
+        ]
+        for name in derived:
+            self.__dict__.pop(name, None)
+
+    async def refresh(self, client: WingmanClient) -> None:
+        dumps = {name: await client.get_json(name) for name in METADATA_ENDPOINTS}
+        self._set(dumps, dt.now(UTC).isoformat())
+        await asyncio.to_thread(self.save_snapshot)
+        logger.info("Refreshed Wingman metadata")
+
+    async def refresh_patches(self, client: WingmanClient) -> None:
+        if self._dumps is None and not self.load_snapshot():
+            await self.refresh(client)
+            self._patches_refreshed = time.monotonic()
+            return
+        patches = await client.get_json("patches")
+        self._patches_refreshed = time.monotonic()
+        if patches == self._dumps.get("patches"):  # pyright: ignore[reportOptionalMemberAccess]
+            return
+        self._set({**self._dumps, "patches": patches}, dt.now(UTC).isoformat())  # pyright: ignore[reportGeneralTypeIssues]
+        await asyncio.to_thread(self.save_snapshot)
+        logger.info(f"Patch list refreshed, most recent patch is {self.mostrecentpatchid}")
+
+    def request_patch_refresh(self, client: WingmanClient) -> asyncio.Task | None:
+        """
+        Refresh the patch list in the background.
+
+        Returns the running refresh if there is one. Does nothing if the list was refreshed
+        less than min_patch_refresh_interval seconds ago, so a stream of records for an
+        unknown patch only causes one request.
+        """
+        if self._patch_refresh is not None and not self._patch_refresh.done():
+            return self._patch_refresh
+        if time.monotonic() - self._patches_refreshed < self.min_patch_refresh_interval:
+            return None
+        self._patch_refresh = asyncio.create_task(self._logged_patch_refresh(client))
+        return self._patch_refresh
+
+    async def _logged_patch_refresh(self, client: WingmanClient) -> None:
+        try:
+            await self.refresh_patches(client)
+        except Exception:
+            self._patches_refreshed = time.monotonic()
+            logger.exception("Could not refresh the patch list")
+
+    def request_refresh(self, client: WingmanClient) -> asyncio.Task | None:
+        """Refresh everything in the background, at most once per min_refresh_interval."""
+        if self._refresh is not None and not self._refresh.done():
+            return self._refresh
+        if time.monotonic() - self._refreshed < self.min_refresh_interval:
+            return None
+        self._refreshed = time.monotonic()
+        self._refresh = asyncio.create_task(self._logged_refresh(client))
+        return self._refresh
+
+    async def _logged_refresh(self, client: WingmanClient) -> None:
+        try:
+            await self.refresh(client)
+        except Exception:
+            logger.exception("Could not refresh Wingman metadata")
+
+    async def run_patch_refresher(self, client: WingmanClient, interval: float) -> None:
+        """Refresh the patch list every interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            task = self.request_patch_refresh(client)
+            if task is not None:
+                await task
+
+    def _dump(self, name: str) -> Any:  # noqa: ANN401
+        # Never fetched here, that would block the event loop. refresh() has to run first
+        if self._dumps is None and not self.load_snapshot():
+            raise MetadataUnavailableError(
+                f"No Wingman metadata, {self.path} is missing and no refresh has succeeded",
+            )
+        return self._dumps[name]  # pyright: ignore[reportOptionalSubscript]
+
+    @cached_property
+    def bossdump(self) -> dict[str, dict]:
+        return self._dump("bosses")
+
+    @cached_property
+    def _boss_ids(self) -> dict[str, list[str]]:
+        bossdump = self.bossdump
+        fractal_cm_boss_ids: list[str] = []
+        strike_boss_ids: list[str] = []
+        raid_boss_ids: list[str] = []
+        golem_ids: list[str] = []
+        for key in bossdump:
+            if bossdump[key]["type"] == "fractal":
+                fractal_cm_boss_ids.append(f"-{key}")
+            elif bossdump[key]["type"] == "strike":
+                strike_boss_ids.append(key)
+            elif bossdump[key]["type"] == "raid":
+                raid_boss_ids.append(key)
+            elif bossdump[key]["type"] == "golem":
+                golem_ids.append(key)
+
+        fractal_cm_boss_ids.remove("-232543")  # Remove full encounter ai
+        raid_cm_boss_ids = [f"-{boss_id}" for boss_id in raid_boss_ids]
+        # Remove wing 1 and 2 and xera as they dont have CMs
+        raid_cm_boss_ids[6:].remove("-16246")
+        strike_boss_ids.remove("21333")  # Remove freezie
+        strike_cm_boss_ids = [f"-{boss_id}" for boss_id in strike_boss_ids][5:]
+        return {
+            "raids": raid_boss_ids,
+            "raids cm": raid_cm_boss_ids,
+            "strikes": strike_boss_ids,
+            "strikes cm": strike_cm_boss_ids,
+            "fractals": fractal_cm_boss_ids,
+            "golem": golem_ids,
+        }
+
+    @cached_property
+    def bosses(self) -> dict[str, BossInfo]:
+        """Everything needed to show a boss, keyed by signed boss id (negative is CM)."""
+        table: dict[str, BossInfo] = {}
+        for key, boss in self.bossdump.items():
+            name = boss["name"]
+            icon_url = f"{WINGMAN_BASE_URL}{boss['icon']}"
+            lcm_name = f"{name} LCM"
+            table[key] = BossInfo(name, name, lcm_name, icon_url, boss["type"])
+            table[f"-{key}"] = BossInfo(name, f"{name} CM", lcm_name, icon_url, boss["type"])
+        return table
+
+    @cached_property
+    def bossidtoname(self) -> dict[str, str]:
+        return {key: boss["name"] for key, boss in self.bossdump.items()}
+
+    @cached_property
+    def boss_content_lists(self) -> dict[str, list[str]]:
+        ids = self._boss_ids
+        all_boss_ids = (
+            ids["fractals"] + ids["strikes"] + ids["strikes cm"] + ids["raids"] + ids["raids cm"]
+        )
+        return {**ids, "all": all_boss_ids}
+
+    @cached_property
+    def boss_content_sets(self) -> dict[str, set[str]]:
+        ids = self._boss_ids
+        return {
+            "raids": set(ids["raids"] + ids["raids cm"]),
+            "strikes": set(ids["strikes"] + ids["strikes cm"]),
+            "fractals": set(ids["fractals"]),
+            "all": set(self.boss_content_lists["all"]),
+        }
+
+    @cached_property
+    def patchidlist(self) -> list[str]:
+        return [patch["id"] for patch in self._dump("patches")["patches"]]
+
+    @cached_property
+    def mostrecentpatchid(self) -> str:
+        return self.patchidlist[0]
+
+    @cached_property
+    def mostrecentpatchstart(self) -> str:
+        return self._dump("patches")["patches"][0]["from"]
+
+    @cached_property
+    def mostrecentpatchstartdt(self) -> dt:
+        return dt.strptime(
+            f"{self.mostrecentpatchstart} 12:30 -0000",
+            "%Y-%m-%d %H:%M %z",
+        )
+
+    @cached_property
+    def professions(self) -> list[str]:
+        return list(self._dump("classes").keys())
+
+
+metadata = WingmanMetadata()
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    # Keep the old module level names working, they now come from the metadata on first use
+    attribute = getattr(WingmanMetadata, name, None)
+    if not name.startswith("_") and isinstance(attribute, cached_property):
+        return getattr(metadata, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import pathlib
+import pickle
+import sqlite3
+import threading
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from datetime import datetime as dt
+from typing import Any
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+sql_seconds = registry.histogram(
+    "wingmanbot_sql_seconds",
+    "Time spent in async database calls, including the wait for the worker thread",
+    ("op",),
+)
+
+
+def _create_tables(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS bossserverchannels(
+        id integer, boss_id text, type text, lowman integer)""",
+    )  # Server channels to ping
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS users(
+        id integer, apikey text, boss_id integer, lastchecked text)""",
+    )  # User data
+
+
+def _add_lowman_column(cur: sqlite3.Cursor) -> None:
+    # Databases made by the old initializedb never had the lowman column
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(bossserverchannels)")]
+    if "lowman" not in columns:
+        cur.execute("ALTER TABLE bossserverchannels ADD COLUMN lowman integer DEFAULT 0")
+
+
+def _add_indexes(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_bossserverchannels_boss
+        ON bossserverchannels(boss_id, type, lowman)""",
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bossserverchannels_id ON bossserverchannels(id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_id ON users(id)")
+
+
+def _dedupe_subscriptions(cur: sqlite3.Cursor) -> None:
+    # Normalise lowman to 0/1 so identical subscriptions compare equal, then keep one row each
+    cur.execute(
+        """UPDATE bossserverchannels
+        SET lowman = CASE WHEN lower(lowman) IN ('1', 'true') THEN 1 ELSE 0 END""",
+    )
+    cur.execute(
+        """DELETE FROM bossserverchannels WHERE rowid NOT IN
+        (SELECT MIN(rowid) FROM bossserverchannels GROUP BY id, boss_id, type, lowman)""",
+    )
+    cur.execute(
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_bossserverchannels_unique
+        ON bossserverchannels(id, boss_id, type, lowman)""",
+    )
+
+
+def _add_user_tracking(cur: sqlite3.Cursor) -> None:
+    # One row per user so updates can upsert instead of delete + insert
+    cur.execute(
+        """DELETE FROM users WHERE rowid NOT IN (SELECT MAX(rowid) FROM users GROUP BY id)""",
+    )
+    cur.execute("DROP INDEX IF EXISTS idx_users_id")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_unique ON users(id)")
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS usertrackedbosses(
+        user_id integer, boss_id text, PRIMARY KEY(user_id, boss_id))""",
+    )  # Bosses each user checks with /check
+
+
+def _add_channel_settings(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS channelsettings(
+        id integer PRIMARY KEY, coalesce_window real)""",
+    )  # Per channel overrides of ping behaviour
+
+
+def _add_autocheck(cur: sqlite3.Cursor) -> None:
+    cur.execute("ALTER TABLE users ADD COLUMN autocheck integer DEFAULT 0")  # Opted in to polling
+
+
+def _add_fingerprint(cur: sqlite3.Cursor) -> None:
+    cur.execute("ALTER TABLE users ADD COLUMN fingerprint text")  # Top logs seen on last check
+
+
+# Index + 1 is the schema version (PRAGMA user_version) after the migration has run.
+# Only ever append to this list.
+MIGRATIONS: list[Callable[[sqlite3.Cursor], None]] = [
+    _create_tables,
+    _add_lowman_column,
+    _add_indexes,
+    _dedupe_subscriptions,
+    _add_user_tracking,
+    _add_channel_settings,
+    _add_autocheck,
+    _add_fingerprint,
+]
+
+
+class Database:
+    """
+    Long-lived SQLite connection for data/wingmanbot.db.
+
+    The connection runs in WAL mode and is shared between threads behind a lock so the
+    async helpers can run queries in a worker thread instead of on the event loop.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._con: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._con is None:
+            with self._lock:
+                if self._con is None:
+                    self._con = self._connect()
+        return self._con
+
+    def _connect(self) -> sqlite3.Connection:
+        pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA busy_timeout=5000")
+        self._migrate(con)
+        return con
+
+    def _migrate(self, con: sqlite3.Connection) -> None:
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"Migrating {self.path} to schema version {target}")
+            cur = con.cursor()
+            try:
+                # sqlite3 only opens transactions for DML on its own, the ALTER TABLEs need one
+                # too so a failed migration is rolled back as a whole
+                cur.execute("BEGIN")
+                migration(cur)
+                cur.execute(f"PRAGMA user_version = {target}")
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+
+    def execute(self, sql: str, params=()) -> None:  # noqa: ANN001
+        con = self.connection
+        with self._lock:
+            con.execute(sql, params)
+            con.commit()
+
+    def executemany(self, sql: str, seq_of_params: Iterable) -> int:
+        """Run a statement for every parameter set in one transaction and return rowcount."""
+        con = self.connection
+        with self._lock:
+            try:
+                cur = con.executemany(sql, seq_of_params)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            return cur.rowcount
+
+    def fetch(self, sql: str, params=()) -> list:  # noqa: ANN001
+        con = self.connection
+        with self._lock:
+            return con.execute(sql, params).fetchall()
+
+    async def aexecute(self, sql: str, params=()) -> None:  # noqa: ANN001
+        with sql_seconds.time(op="execute"):
+            await asyncio.to_thread(self.execute, sql, params)
+
+    async def aexecutemany(self, sql: str, seq_of_params: Iterable) -> int:
+        with sql_seconds.time(op="executemany"):
+            return await asyncio.to_thread(self.executemany, sql, list(seq_of_params))
+
+    async def afetch(self, sql: str, params=()) -> list:  # noqa: ANN001
+        with sql_seconds.time(op="fetch"):
+            return await asyncio.to_thread(self.fetch, sql, params)
+
+    def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:  # noqa: ANN401
+        """Call fn with the connection inside a single transaction."""
+        con = self.connection
+        with self._lock:
+            try:
+                result = fn(con)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            return result
+
+    async def arun(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:  # noqa: ANN401
+        with sql_seconds.time(op="run"):
+            return await asyncio.to_thread(self.run, fn)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+
+@dataclass
+class UserData:
+    id: int
+    apikey: str | None = None
+    lastchecked: dt | None = None
+    tracked_boss_ids: set[str] = field(default_factory=set)
+    autocheck: bool = False
+    # {"patch": patch id, "logs": pbdiff fingerprint} from the last check
+    fingerprint: dict[str, Any] | None = None
+
+
+class UserStore:
+    """
+    Row-level storage for per-user /check state.
+
+    Every change is written straight through to its own rows, so the cost of an update does
+    not depend on how many users are registered.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+
+    def _get(self, con: sqlite3.Connection, user_id: int) -> UserData | None:
+        row = con.execute(
+            "SELECT apikey, lastchecked, autocheck, fingerprint FROM users WHERE id = ?",
+            (user_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        apikey, lastchecked, autocheck, fingerprint = row
+        tracked = con.execute(
+            "SELECT boss_id FROM usertrackedbosses WHERE user_id = ?",
+            (user_id,),
+        ).fetchall()
+        return UserData(
+            id=user_id,
+            apikey=apikey,
+            lastchecked=dt.fromisoformat(lastchecked) if lastchecked else None,
+            tracked_boss_ids={boss_id for (boss_id,) in tracked},
+            autocheck=bool(autocheck),
+            fingerprint=json.loads(fingerprint) if fingerprint else None,
+        )
+
+    async def get(self, user_id: int) -> UserData | None:
+        return await self.db.arun(lambda con: self._get(con, user_id))
+
+    async def set_apikey(self, user_id: int, apikey: str) -> None:
+        await self.db.aexecute(
+            """INSERT INTO users(id, apikey) VALUES(?, ?)
+            ON CONFLICT(id) DO UPDATE SET apikey = excluded.apikey""",
+            (user_id, apikey),
+        )
+
+    async def set_lastchecked(self, user_id: int, lastchecked: dt | None) -> None:
+        # Starts a new baseline, so the fingerprint of the old one is dropped
+        await self.db.aexecute(
+            "UPDATE users SET lastchecked = ?, fingerprint = NULL WHERE id = ?",
+            (lastchecked.isoformat() if lastchecked else None, user_id),
+        )
+
+    async def set_checked(
+        self,
+        user_id: int,
+        lastchecked: dt,
+        patch_id: str,
+        logs: dict[str, str],
+    ) -> None:
+        fingerprint = json.dumps({"patch": patch_id, "logs": logs}, separators=(",", ":"))
+        await self.db.aexecute(
+            "UPDATE users SET lastchecked = ?, fingerprint = ? WHERE id = ?",
+            (lastchecked.isoformat(), fingerprint, user_id),
+        )
+
+    async def set_autocheck(self, user_id: int, enabled: bool) -> None:
+        await self.db.aexecute("UPDATE users SET autocheck = ? WHERE id = ?", (enabled, user_id))
+
+    async def autocheck_user_ids(self) -> list[int]:
+        rows = await self.db.afetch("SELECT id FROM users WHERE autocheck = 1 ORDER BY id")
+        return [user_id for (user_id,) in rows]
+
+    async def track(self, user_id: int, boss_ids: Iterable[str]) -> None:
+        await self.db.aexecutemany(
+            "INSERT OR IGNORE INTO usertrackedbosses VALUES(?, ?)",
+            [(user_id, boss_id) for boss_id in boss_ids],
+        )
+
+    def import_pickle(self, path: str) -> int:
+        """
+        Load users from an old workingdata.pkl and return how many were imported.
+
+        API keys already saved with /adduser win over the ones in the pickle.
+        """
+        with open(path, "rb") as f:
+            workingdata = pickle.load(f)
+
+        def _import(con: sqlite3.Connection) -> int:
+            for user_id, data in workingdata["user"].items():
+                lastchecked = data.get("lastchecked")
+                con.execute(
+                    """INSERT INTO users(id, apikey, lastchecked) VALUES(?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                    apikey = COALESCE(users.apikey, excluded.apikey),
+                    lastchecked = excluded.lastchecked""",
+                    (user_id, data.get("apikey"), lastchecked.isoformat() if lastchecked else None),
+                )
+                con.executemany(
+                    "INSERT OR IGNORE INTO usertrackedbosses VALUES(?, ?)",
+                    [(user_id, boss_id) for boss_id in data.get("tracked_boss_ids", ())],
+                )
+            return len(workingdata["user"])
+
+        return self.db.run(_import)
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from collections.abc import Iterable
+
+SubscriptionKey = tuple[str, str, bool]
+
+
+def as_lowman(value: object) -> bool:
+    # lowman has been stored as ints, bools and "true"/"false" strings over time
+    if isinstance(value, str):
+        return value.strip().lower() in {"1", "true"}
+    return bool(value)
+
+
+class SubscriptionIndex:
+    """
+    In-memory copy of bossserverchannels keyed by (boss_id, type, lowman).
+
+    Loaded once from the database at startup and kept in step with every write so the
+    webhook path can find the channels that want a ping without touching the disk.
+    """
+
+    def __init__(self) -> None:
+        self._channels: defaultdict[SubscriptionKey, set[int]] = defaultdict(set)
+        self._keys_by_channel: defaultdict[int, set[SubscriptionKey]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._keys_by_channel.values())
+
+    def load(self, rows: Iterable[tuple[int, str, str, object]]) -> None:
+        """Replace the index contents with (channel_id, boss_id, type, lowman) rows."""
+        self._channels.clear()
+        self._keys_by_channel.clear()
+        for channel_id, boss_id, ping_type, lowman in rows:
+            self.add(channel_id, boss_id, ping_type, lowman)
+
+    def add(self, channel_id: int, boss_id: str, ping_type: str, lowman: object) -> None:
+        key = (str(boss_id), ping_type, as_lowman(lowman))
+        self._channels[key].add(int(channel_id))
+        self._keys_by_channel[int(channel_id)].add(key)
+
+    def discard(self, channel_id: int, boss_id: str, ping_type: str, lowman: object) -> None:
+        key = (str(boss_id), ping_type, as_lowman(lowman))
+        channels = self._channels.get(key)
+        if channels is not None:
+            channels.discard(int(channel_id))
+            if not channels:
+                del self._channels[key]
+        keys = self._keys_by_channel.get(int(channel_id))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_channel[int(channel_id)]
+
+    def remove_channel(self, channel_id: int) -> int:
+        """Drop every subscription of a channel and return how many there were."""
+        keys = self._keys_by_channel.pop(int(channel_id), set())
+        for key in keys:
+            channels = self._channels.get(key)
+            if channels is not None:
+                channels.discard(int(channel_id))
+                if not channels:
+                    del self._channels[key]
+        return len(keys)
+
+    def channels(self, boss_id: str, ping_type: str, lowman: bool | None = None) -> set[int]:
+        """Channels subscribed to a boss and ping type. lowman=None matches both."""
+        if lowman is not None:
+            return set(self._channels.get((boss_id, ping_type, lowman), ()))
+        return self._channels.get((boss_id, ping_type, True), set()) | self._channels.get(
+            (boss_id, ping_type, False),
+            set(),
+        )
+
+    def subscriptions_for_boss(self, boss_id: str) -> set[tuple[int, str, bool]]:
+        """Distinct (channel_id, type, lowman) subscriptions that include a boss."""
+        return {
+            (channel_id, ping_type, lowman)
+            for (key_boss_id, ping_type, lowman), channel_ids in self._channels.items()
+            if key_boss_id == boss_id
+            for channel_id in channel_ids
+        }
+
+    def channel_ids(self) -> set[int]:
+        return set(self._keys_by_channel)
@@ -0,0 +1,71 @@
+import asyncio
+
+import discord
+
+from coalesce import BurstCoalescer
+from dispatch import FanoutDispatcher
+
+KEY = ("1234", "dps")
+CHANNEL_ID = 1
+
+
+class FakeMessage:
+    def __init__(self, content: str) -> None:
+        self.id = 1
+        self.content = content
+        self.edits: list[discord.Embed] = []
+
+    async def edit(self, *, embed: discord.Embed) -> None:
+        self.edits.append(embed)
+
+
+class FakeSender:
+    def __init__(self, delay: float = 0.0, fail: bool = False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.posted: list[FakeMessage] = []
+
+    async def __call__(self, channel: object, embed: discord.Embed) -> FakeMessage | None:  # noqa: ARG002
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            self.fail = False
+            return None
+        message = FakeMessage(embed.title or "")
+        self.posted.append(message)
+        return message
+
+
+async def send_burst(sender: FakeSender, window: float, records: int) -> None:
+    dispatcher = FanoutDispatcher()
+    coalescer = BurstCoalescer(dispatcher, sender, default_window=window)  # pyright: ignore[reportArgumentType]
+    for i in range(records):
+        send = coalescer.add(None, CHANNEL_ID, KEY, discord.Embed(title=f"r{i}"), f"r{i}")  # pyright: ignore[reportArgumentType]
+        if send is not None:
+            dispatcher.submit([(CHANNEL_ID, send)])
+    while dispatcher.pending or coalescer._bursts:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(window + sender.delay + 0.05)
+    while dispatcher.pending:
+        await asyncio.sleep(0.01)
+
+
+def test_burst_edits_first_message() -> None:
+    sender = FakeSender()
+    asyncio.run(send_burst(sender, window=0.05, records=3))
+    assert [m.content for m in sender.posted] == ["r0"]
+    assert [e.title for e in sender.posted[0].edits] == ["r2"]
+
+
+def test_slow_first_send_is_edited_not_reposted() -> None:
+    # The window closes while the first send is still waiting on Discord
+    sender = FakeSender(delay=0.2)
+    asyncio.run(send_burst(sender, window=0.05, records=3))
+    assert [m.content for m in sender.posted] == ["r0"]
+    assert [e.title for e in sender.posted[0].edits] == ["r2"]
+
+
+def test_failed_first_send_posts_merged() -> None:
+    sender = FakeSender(fail=True)
+    asyncio.run(send_burst(sender, window=0.05, records=3))
+    assert [m.content for m in sender.posted] == ["r2"]
+    assert sender.posted[0].edits == []
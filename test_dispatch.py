@@ -0,0 +1,40 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from dispatch import FanoutDispatcher
+
+
+def recorder(order: list[str], name: str) -> Callable[[], Awaitable[None]]:
+    async def send() -> None:
+        order.append(name)
+
+    return send
+
+
+async def dispatch(dispatcher: FanoutDispatcher, groups: list[list[tuple[int, str]]]) -> list[str]:
+    order: list[str] = []
+    for group in groups:
+        dispatcher.submit([(route, recorder(order, name)) for route, name in group])
+    while dispatcher.pending:
+        await asyncio.sleep(0.001)
+    return order
+
+
+def test_groups_are_served_round_robin() -> None:
+    # One record to many channels must not hold back the records queued after it
+    big = [(route, f"big{route}") for route in range(20)]
+    dispatcher = FanoutDispatcher(max_in_flight=1, global_rate=1000, route_rate=1000)
+    order = asyncio.run(
+        dispatch(dispatcher, [big, [(100, "small0")], [(101, "small1")]]),
+    )
+    assert order[:6] == ["big0", "small0", "small1", "big1", "big2", "big3"]
+    assert sorted(order) == sorted([name for _, name in big] + ["small0", "small1"])
+
+
+def test_rate_limited_route_does_not_block_others() -> None:
+    # Route 1 has used its burst, the other record's send goes first
+    dispatcher = FanoutDispatcher(max_in_flight=1, global_rate=1000, route_rate=20, route_burst=1)
+    order = asyncio.run(
+        dispatch(dispatcher, [[(1, "first")], [(1, "second")], [(2, "other")]]),
+    )
+    assert order == ["first", "other", "second"]
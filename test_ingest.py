@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from benchmarks.bench_webhooks import synthetic_record
+from ingest import validate_record
+
+
+def record_of_type(record_type: str, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    while True:
+        record = synthetic_record(rng, ["19450"]) | {"link": "20250101-120000_19450"}
+        if record["type"] == record_type:
+            return record
+
+
+@pytest.mark.parametrize("record_type", ["time", "dps", "supportdps"])
+@pytest.mark.parametrize("seed", range(5))
+def test_complete_records_are_valid(record_type: str, seed: int) -> None:
+    assert validate_record(record_of_type(record_type, seed)) is None
+
+
+@pytest.mark.parametrize(
+    ("record_type", "field"),
+    [
+        ("time", "eraID"),
+        ("time", "duration"),
+        ("time", "link"),
+        ("dps", "dps"),
+        ("dps", "account"),
+        ("supportdps", "previousDps"),
+    ],
+)
+def test_missing_fields_are_rejected(record_type: str, field: str) -> None:
+    record = record_of_type(record_type)
+    del record[field]
+    assert validate_record(record) == f"Missing {field}"
+
+
+def test_wrong_types_are_rejected() -> None:
+    record = record_of_type("dps")
+    assert validate_record(record | {"dps": "fast"}) == "Invalid dps"
+    assert validate_record(record | {"previousDps": True}) == "Invalid previousDps"
+    assert validate_record([record]) == "Payload must be a JSON object"
+
+
+def test_lowman_records_need_the_previous_player_count() -> None:
+    record = record_of_type("time") | {"isLowman": True}
+    record.pop("previousPlayerAmount", None)
+    assert validate_record(record) == "Missing previousPlayerAmount"
+    assert validate_record(record | {"previousPlayerAmount": 4}) is None
+    # Only lowman records are shown with it, so a false flag does not need one
+    assert validate_record(record | {"isLowman": False}) is None
@@ -0,0 +1,54 @@
+from datetime import datetime as dt
+
+import pytest
+
+from benchmarks.bench_logtime import make_links
+from logtime import LINK_TZ, epochs_from_links, timestamp_from_link
+
+UPLOADED = dt(2024, 2, 29, 23, 5, 9, tzinfo=LINK_TZ)
+
+
+@pytest.mark.parametrize(
+    "link",
+    [
+        "20240229-230509_vg",
+        "a1Bc-20240229-230509_sabetha",
+        # Boss names with a dash must not be mistaken for the other link format
+        "20240229-230509_kaineng-overlook",
+        "a1Bc-20240229-230509_old-lions-court",
+        "20240229-230509_x-y-z",
+    ],
+)
+def test_timestamp_from_link(link: str) -> None:
+    assert timestamp_from_link(link) == UPLOADED
+    assert epochs_from_links([link]) == [int(UPLOADED.timestamp())]
+
+
+@pytest.mark.parametrize(
+    "link",
+    [
+        "20230229-230509_vg",  # Not a leap year
+        "20240431-230509_vg",
+        "20241301-230509_vg",
+        "20240001-230509_vg",
+        "20240229-240509_vg",
+        "20240229-236009_vg",
+        "a1Bc-20240229-230560_sabetha",
+        "2024022x-230509_vg",
+        "a1Bc-20240229-2305_sabetha",
+        "vg",
+        "",
+    ],
+)
+def test_invalid_links_raise(link: str) -> None:
+    # Days past the end of the month are left to date() and datetime() to reject
+    with pytest.raises(ValueError, match=r"timestamp|day is out of range"):
+        timestamp_from_link(link)
+    with pytest.raises(ValueError, match=r"timestamp|day is out of range"):
+        epochs_from_links([link])
+
+
+def test_epochs_match_timestamps() -> None:
+    links = make_links(500)
+    expected = [int(timestamp_from_link(link).timestamp()) for link in links]
+    assert epochs_from_links(links) == expected
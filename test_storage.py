@@ -0,0 +1,143 @@
+import asyncio
+import pickle
+import sqlite3
+from datetime import datetime as dt
+from pathlib import Path
+
+import pytest
+
+import storage
+from storage import Database, UserStore, sql_seconds
+
+
+def columns(path: str, table: str) -> list[str]:
+    with sqlite3.connect(path) as con:
+        return [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+
+
+def user_version(path: str) -> int:
+    with sqlite3.connect(path) as con:
+        return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_failed_migration_is_rolled_back(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def half_applied(cur: sqlite3.Cursor) -> None:
+        cur.execute("ALTER TABLE users ADD COLUMN broken integer")
+        raise RuntimeError("migration failed")
+
+    path = str(tmp_path / "wingmanbot.db")
+    monkeypatch.setattr(storage, "MIGRATIONS", [storage._create_tables, half_applied])
+    db = Database(path)
+    with pytest.raises(RuntimeError):
+        db.connection  # noqa: B018
+    db.close()
+
+    assert "broken" not in columns(path, "users")
+    assert user_version(path) == 1
+
+
+def test_migrates_to_latest(tmp_path: Path) -> None:
+    path = str(tmp_path / "wingmanbot.db")
+    db = Database(path)
+    db.fetch("SELECT 1")
+    db.close()
+
+    assert user_version(path) == len(storage.MIGRATIONS)
+    assert {"autocheck", "fingerprint"} <= set(columns(path, "users"))
+
+
+def test_dedupe_subscriptions(tmp_path: Path) -> None:
+    path = str(tmp_path / "wingmanbot.db")
+    # A database as the bot left it before subscriptions were deduplicated
+    with sqlite3.connect(path) as con:
+        cur = con.cursor()
+        for migration in storage.MIGRATIONS[: storage.MIGRATIONS.index(storage._add_indexes) + 1]:
+            migration(cur)
+        cur.execute(f"PRAGMA user_version = {storage.MIGRATIONS.index(storage._add_indexes) + 1}")
+        cur.executemany(
+            "INSERT INTO bossserverchannels VALUES(?, ?, ?, ?)",
+            [
+                (1, "19450", "dps", "True"),
+                (1, "19450", "dps", 1),
+                (1, "19450", "dps", "False"),
+                (1, "19450", "dps", 0),
+                (1, "19450", "time", 0),
+                (2, "19450", "dps", 0),
+            ],
+        )
+    con.close()
+
+    db = Database(path)
+    rows = db.fetch("SELECT id, boss_id, type, lowman FROM bossserverchannels ORDER BY rowid")
+    assert rows == [
+        (1, "19450", "dps", 1),
+        (1, "19450", "dps", 0),
+        (1, "19450", "time", 0),
+        (2, "19450", "dps", 0),
+    ]
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("INSERT INTO bossserverchannels VALUES(1, '19450', 'dps', 0)")
+    db.close()
+
+
+def test_subscribing_twice_adds_nothing(tmp_path: Path) -> None:
+    db = Database(str(tmp_path / "wingmanbot.db"))
+    subs = [(1, "19450", "dps", False), (1, "-19450", "dps", False), (2, "19450", "time", True)]
+    sql = "INSERT OR IGNORE INTO bossserverchannels VALUES(?,?,?,?)"
+
+    assert db.executemany(sql, subs) == len(subs)
+    assert db.executemany(sql, subs) == 0
+    assert len(db.fetch("SELECT * FROM bossserverchannels")) == len(subs)
+    db.close()
+
+
+def test_import_pickle(tmp_path: Path) -> None:
+    lastchecked = dt.fromisoformat("2024-11-05T12:30:00")
+    workingdata = {
+        "user": {
+            1: {"apikey": "old-key", "lastchecked": lastchecked, "tracked_boss_ids": {"19450"}},
+            2: {"apikey": None, "lastchecked": None, "tracked_boss_ids": {"19450", "-19450"}},
+            3: {"apikey": "pickle-key", "lastchecked": None},
+        },
+    }
+    picklepath = tmp_path / "workingdata.pkl"
+    picklepath.write_bytes(pickle.dumps(workingdata))
+    db = Database(str(tmp_path / "wingmanbot.db"))
+    users = UserStore(db)
+
+    async def run() -> None:
+        await users.set_apikey(3, "adduser-key")
+        assert users.import_pickle(str(picklepath)) == len(workingdata["user"])
+        # Importing again must not duplicate anything
+        users.import_pickle(str(picklepath))
+
+        first = await users.get(1)
+        assert first is not None
+        assert first.apikey == "old-key"
+        assert first.lastchecked == lastchecked
+        assert first.tracked_boss_ids == {"19450"}
+
+        # Imported without a key, /check and /flex must treat it as unregistered
+        keyless = await users.get(2)
+        assert keyless is not None
+        assert keyless.apikey is None
+        assert keyless.tracked_boss_ids == {"19450", "-19450"}
+
+        # Keys saved with /adduser win over the pickle
+        added = await users.get(3)
+        assert added is not None
+        assert added.apikey == "adduser-key"
+
+    asyncio.run(run())
+    assert len(db.fetch("SELECT id FROM users")) == len(workingdata["user"])
+    db.close()
+
+
+def test_user_lookups_are_timed(tmp_path: Path) -> None:
+    db = Database(str(tmp_path / "wingmanbot.db"))
+    users = UserStore(db)
+    before = sql_seconds.count(op="run")
+
+    assert asyncio.run(users.get(1)) is None
+    assert sql_seconds.count(op="run") == before + 1
+    db.close()
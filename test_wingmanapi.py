@@ -0,0 +1,56 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from aiohttp import web
+
+from wingmanapi import WingmanClient
+
+DOCUMENT = {"account": "Test.1234", "topBossTimes": {}}
+ETAG = '"v1"'
+
+
+async def with_client(test: Callable[[WingmanClient, list[str | None]], Awaitable[None]]) -> None:
+    """Run test against a getPlayerStats server that honours If-None-Match."""
+    seen: list[str | None] = []
+
+    async def player_stats(request: web.Request) -> web.Response:
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == ETAG:
+            return web.Response(status=304)
+        return web.json_response(DOCUMENT, headers={"ETag": ETAG})
+
+    app = web.Application()
+    app.router.add_get("/api/getPlayerStats", player_stats)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    client = WingmanClient(base_url=f"http://127.0.0.1:{runner.addresses[0][1]}", cache_ttl=0)
+    try:
+        await test(client, seen)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def test_polls_revalidate_without_touching_the_cache() -> None:
+    async def test(client: WingmanClient, seen: list[str | None]) -> None:
+        assert await client.poll_player_stats("key") == DOCUMENT
+        assert await client.poll_player_stats("key") is None
+        assert seen == [None, ETAG]
+        assert len(client.player_cache) == 0
+        assert client.player_cache.misses == 0
+
+    asyncio.run(with_client(test))
+
+
+def test_polls_use_cached_entries() -> None:
+    async def test(client: WingmanClient, seen: list[str | None]) -> None:
+        assert await client.get_player_stats("key") == DOCUMENT
+        # The cached document may not have been checked by a poll yet, so it is returned
+        assert await client.poll_player_stats("key") == DOCUMENT
+        assert seen == [None, ETAG]
+        assert client.player_cache.stats()["misses"] == 1
+        assert client.player_cache.stats()["revalidated"] == 0
+
+    asyncio.run(with_client(test))
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+WINGMAN_BASE_URL = "https://gw2wingman.nevermindcreations.de"
+# Where the API is fetched from, icons and log links always point at the real site
+WINGMAN_API_BASE_URL = os.environ.get("WINGMAN_API_BASE_URL", WINGMAN_BASE_URL).rstrip("/")
+
+request_seconds = registry.histogram(
+    "wingmanbot_wingman_request_seconds",
+    "Latency of Wingman API requests, not counting the wait for a free connection",
+    ("endpoint",),
+)
+request_failures = registry.counter(
+    "wingmanbot_wingman_request_failures_total",
+    "Wingman API requests that failed or timed out",
+    ("endpoint",),
+)
+
+
+class WingmanAPIError(Exception):
+    """Raised when the Wingman API cannot be reached or returns a bad response."""
+
+
+@dataclass
+class CacheEntry:
+    data: Any
+    fetched_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of decoded API responses with a time-to-live.
+
+    Stale entries with an ETag or Last-Modified are kept around (until evicted) so their
+    validators can be used for a conditional request instead of downloading the whole
+    document again. Stale entries without validators are of no use and are dropped.
+    """
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 256) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self.peek(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def peek(self, key: str) -> CacheEntry | None:
+        """Like get() but leaves the LRU order alone."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._is_dead(entry):
+            del self._entries[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.fetched_at < self.ttl
+
+    def _is_dead(self, entry: CacheEntry) -> bool:
+        return not self.is_fresh(entry) and entry.etag is None and entry.last_modified is None
+
+    def prune(self) -> None:
+        """Drop stale entries that cannot be revalidated."""
+        for key in [key for key, entry in self._entries.items() if self._is_dead(entry)]:
+            del self._entries[key]
+            self.expired += 1
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        self.prune()
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+class WingmanClient:
+    """
+    Shared async client for the Wingman API.
+
+    One keep-alive connection pool is reused for every request, each request gets its own
+    timeout and the number of requests in flight at once is capped so a burst of slash
+    commands cannot flood Wingman or the event loop.
+    """
+
+    def __init__(
+        self,
+        base_url: str = WINGMAN_API_BASE_URL,
+        timeout: float = 15.0,
+        max_concurrency: int = 8,
+        cache_ttl: float = 60.0,
+        cache_size: int = 256,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: aiohttp.ClientSession | None = None
+        self.player_cache = ResponseCache(ttl=cache_ttl, maxsize=cache_size)
+        # (ETag, Last-Modified) of the last document poll_player_stats got for each API key
+        self._poll_validators: dict[str, tuple[str | None, str | None]] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                ttl_dns_cache=300,
+                ssl=False,  # Matches the unverified context used everywhere else
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                raise_for_status=True,
+            )
+        return self._session
+
+    async def _request(
+        self,
+        path: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        url = f"{self.base_url}/api/{path.lstrip('/')}"
+        endpoint = path.strip("/")
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                async with self._get_session().get(url, params=params, headers=headers) as resp:
+                    body = await resp.read()
+                    return resp.status, resp.headers, body
+            except (aiohttp.ClientError, TimeoutError) as e:
+                request_failures.inc(endpoint=endpoint)
+                raise WingmanAPIError(f"Request to {path} failed") from e
+            finally:
+                request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+
+    @staticmethod
+    def _decode(path: str, body: bytes) -> Any:  # noqa: ANN401
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise WingmanAPIError(f"Invalid JSON from {path}") from e
+
+    async def get_json(self, path: str, params: dict[str, str] | None = None) -> Any:  # noqa: ANN401
+        _, _, body = await self._request(path, params)
+        return self._decode(path, body)
+
+    async def get_player_stats(self, apikey: str, *, use_cache: bool = True) -> dict:
+        """
+        Fetch the getPlayerStats document for an API key.
+
+        Fresh cache entries skip the network entirely. Stale entries are revalidated with
+        If-None-Match/If-Modified-Since when Wingman sent validators for them.
+        """
+        cache = self.player_cache
+        entry = cache.get(apikey) if use_cache else None
+        if entry is not None and cache.is_fresh(entry):
+            cache.hits += 1
+            return entry.data
+
+        validators = (entry.etag, entry.last_modified) if entry is not None else (None, None)
+        status, resp_headers, body = await self._fetch_player_stats(apikey, *validators)
+        if status == 304 and entry is not None:  # noqa: PLR2004
+            cache.revalidated += 1
+            entry.fetched_at = time.monotonic()
+            return entry.data
+
+        cache.misses += 1
+        data = self._decode("getPlayerStats", body)
+        # Dont cache errors so a retry right after fixing the key goes through
+        if isinstance(data, dict) and "error" not in data:
+            cache.put(
+                apikey,
+                CacheEntry(
+                    data=data,
+                    fetched_at=time.monotonic(),
+                    etag=resp_headers.get("ETag"),
+                    last_modified=resp_headers.get("Last-Modified"),
+                ),
+            )
+        return data
+
+    async def poll_player_stats(self, apikey: str) -> dict | None:
+        """
+        Fetch the getPlayerStats document for a background poll.
+
+        Every poll is a conditional request, and None means the document has not changed
+        since the last poll for this key. Polls never add entries to player_cache or count
+        towards its hits and misses, so polling many users cannot push out the entries of
+        people running commands. An entry that is already cached is used and kept current.
+        """
+        cache = self.player_cache
+        entry = cache.peek(apikey)
+        if entry is not None and cache.is_fresh(entry):
+            return entry.data
+        if entry is not None:
+            validators = (entry.etag, entry.last_modified)
+        else:
+            validators = self._poll_validators.get(apikey, (None, None))
+
+        status, resp_headers, body = await self._fetch_player_stats(apikey, *validators)
+        if status == 304:  # noqa: PLR2004
+            if entry is None:
+                return None
+            entry.fetched_at = time.monotonic()
+            return entry.data
+
+        data = self._decode("getPlayerStats", body)
+        if isinstance(data, dict) and "error" not in data:
+            etag, last_modified = resp_headers.get("ETag"), resp_headers.get("Last-Modified")
+            self._poll_validators[apikey] = (etag, last_modified)
+            if entry is not None:
+                entry.data, entry.fetched_at = data, time.monotonic()
+                entry.etag, entry.last_modified = etag, last_modified
+        return data
+
+    async def _fetch_player_stats(
+        self,
+        apikey: str,
+        etag: str | None,
+        last_modified: str | None,
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return await self._request(
+            "getPlayerStats",
+            params={"apikey": apikey},
+            headers=headers or None,
+        )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()